@@ -1,11 +1,25 @@
 from typing import Optional, List
 import duckdb
+import os
 import re
+import shutil
+import tempfile
 import contextlib
+import datetime
+import functools
+import json
+import threading
+import time
+import numpy as np
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+import snapshots
+from utils.positions import PositionSnapshot
+from utils.singleflight import SingleFlight
+from utils.spatial import SphereGridIndex
+
 # --- 1. INITIALIZATION ---
 app = FastAPI(
     title="Thalassa API",
@@ -50,6 +64,11 @@ def debug_cors(request: Request):
     origin = request.headers.get("origin")
     return {"received_origin": origin, "message": "CORS debug ok"}
 
+@app.get("/api/debug/singleflight")
+def debug_single_flight():
+    """How many requests were coalesced onto an in-flight execution."""
+    return _single_flight.stats()
+
 DB_PATH = './LOCAL/Resources/argo.db'
 
 try:
@@ -108,19 +127,75 @@ def _distinct_positions_table(year: int) -> str:
 def _argo_table(year: int) -> str:
     return _year_table("argo", year)
 
+# Columns added by apps/llm/ingest.py steps, looked up once per database version so
+# re-ingesting is picked up without restarting the API.
+_columns = {}
+
+def _has_column(c, table: str, column: str) -> bool:
+    version = _db_version()
+    cached = _columns.get((table, column))
+    if cached is None or cached[0] != version:
+        found = c.execute(
+            "SELECT COUNT(*) FROM duckdb_columns() WHERE table_name = ? AND column_name = ?",
+            [table, column]
+        ).fetchone()[0] > 0
+        cached = _columns[(table, column)] = (version, found)
+    return cached[1]
+
+# QC-applied columns written by apps/llm/ingest.py (--steps clean): NaN and failed QC
+# are NULL there. Databases that have not been re-ingested only have the raw columns.
+def _has_clean_columns(c, year: int) -> bool:
+    return _has_column(c, f"argo{year}", "temp_c_good")
+
+def _measurement_columns(c, year: int):
+    """(select list, extra WHERE clause) for depth/temperature/salinity of argo{year}."""
+    if _has_clean_columns(c, year):
+        # Measurements without a valid depth cannot be placed on a profile
+        return "depth_m_good AS depth_m, temp_c_good AS temp_c, sal_psu_good AS sal_psu", " AND depth_m_good IS NOT NULL"
+    return "depth_m, temp_c, sal_psu", ""
+
+# Douglas–Peucker significance of each position, from apps/llm/ingest.py (--steps paths).
+# A path simplified to tolerance t keeps the positions with significance_km > t.
+ZOOM0_KM_PER_PIXEL = 40075.016686 / 256  # web map ground resolution at the equator, zoom 0
+
+def _has_path_significance(c, year: int) -> bool:
+    return _has_column(c, f"distinct_float_positions_{year}", "significance_km")
+
+def _path_tolerance(tolerance_km: Optional[float], zoom: Optional[float]) -> Optional[float]:
+    """Simplification tolerance in km: explicit, or about one pixel at the given web map zoom."""
+    if tolerance_km is not None:
+        return tolerance_km
+    if zoom is not None:
+        return ZOOM0_KM_PER_PIXEL / 2 ** zoom
+    return None
+
+PATH_TOLERANCE_QUERY = Query(None, ge=0, description="Simplify the path: drop positions within this many km of the simplified line")
+PATH_ZOOM_QUERY = Query(None, ge=0, le=24, description="Simplify the path to about one pixel at this web map zoom level")
+
+def _records(df):
+    """DataFrame rows as dicts, with NULL/NaN measurements as JSON null."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
 @app.get("/api/float/{platform_id}/path")
-def get_float_path(platform_id: int, year: int = Query(2023, description="Year for which to return float path")):
+def get_float_path(platform_id: int, year: int = Query(2023, description="Year for which to return float path"),
+                   tolerance_km: Optional[float] = PATH_TOLERANCE_QUERY, zoom: Optional[float] = PATH_ZOOM_QUERY):
     year = _validate_year(year)
     table = _distinct_positions_table(year)
-    query = f"""
-            SELECT date, lat, lon
-            FROM {table}
-            WHERE platform_id = ?
-            ORDER BY date;
-            """
+    tolerance = _path_tolerance(tolerance_km, zoom)
     with get_con() as c:
         try:
-            df = c.execute(query, [platform_id]).fetchdf()
+            params = [platform_id]
+            simplify = ""
+            if tolerance is not None and _has_path_significance(c, year):
+                simplify = " AND significance_km > ?"
+                params.append(tolerance)
+            query = f"""
+                    SELECT date, lat, lon
+                    FROM {table}
+                    WHERE platform_id = ?{simplify}
+                    ORDER BY date;
+                    """
+            df = c.execute(query, params).fetchdf()
             if df.empty:
                 raise HTTPException(status_code=404, detail=f"Float with ID {platform_id} not found for year {year}.")
             return df.to_dict(orient='records')
@@ -132,41 +207,58 @@ def get_float_path(platform_id: int, year: int = Query(2023, description="Year f
 @app.get("/api/float/{platform_id}/profile")
 def get_float_latest_profile(platform_id: int, year: int = Query(2023, description="Year for which to return latest profile")):
     year = _validate_year(year)
+    profiles = _mapped_dataset(f"latest_profiles_{year}")
+    if profiles is not None:
+        return _mapped_profile(profiles, platform_id, year)
     argotable = _argo_table(year)
-    query = f"""
-            WITH LatestDate AS (
-                SELECT MAX(date) AS max_date
-                FROM {argotable}
-                WHERE platform_id = ?
-            )
-            SELECT depth_m, temp_c, sal_psu
-            FROM {argotable}
-            WHERE platform_id = ? AND date = (SELECT max_date FROM LatestDate)
-            ORDER BY depth_m;
-            """
     with get_con() as c:
         try:
+            columns, valid = _measurement_columns(c, year)
+            query = f"""
+                    WITH LatestDate AS (
+                        SELECT MAX(date) AS max_date
+                        FROM {argotable}
+                        WHERE platform_id = ?
+                    )
+                    SELECT {columns}
+                    FROM {argotable}
+                    WHERE platform_id = ? AND date = (SELECT max_date FROM LatestDate){valid}
+                    ORDER BY depth_m;
+                    """
             df = c.execute(query, [platform_id, platform_id]).fetchdf()
             if df.empty:
                 raise HTTPException(status_code=404, detail=f"Profile data for float ID {platform_id} not found for year {year}.")
-            return df.to_dict(orient='records')
+            return _records(df)
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+def _mapped_profile(profiles: dict, platform_id: int, year: int) -> list:
+    """A float's latest profile from the exported snapshot, shaped like the query result."""
+    i = int(np.searchsorted(profiles["platform_id"], platform_id))
+    if i == len(profiles["platform_id"]) or profiles["platform_id"][i] != platform_id:
+        raise HTTPException(status_code=404, detail=f"Profile data for float ID {platform_id} not found for year {year}.")
+    block = slice(int(profiles["offsets"][i]), int(profiles["offsets"][i + 1]))
+    columns = {name: profiles[name][block].tolist() for name in ("depth_m", "temp_c", "sal_psu")}
+    return [
+        {name: (None if value != value else value) for name, value in zip(columns, values)}  # NaN -> null
+        for values in zip(*columns.values())
+    ]
+
 @app.get("/api/float/{platform_id}/dossier")
 def get_float_dossier(platform_id: int, year: int = Query(2023, description="Year for which to return dossier")):
     year = _validate_year(year)
     argotable = _argo_table(year)
-    query = f"""
-            SELECT date, depth_m, temp_c, sal_psu
-            FROM {argotable}
-            WHERE platform_id = ?
-            ORDER BY date, depth_m;
-            """
     with get_con() as c:
         try:
+            columns, valid = _measurement_columns(c, year)
+            query = f"""
+                    SELECT date, {columns}
+                    FROM {argotable}
+                    WHERE platform_id = ?{valid}
+                    ORDER BY date, depth_m;
+                    """
             df = c.execute(query, [platform_id]).fetchdf()
             rowcount = len(df.index)
             print(f"[dossier] platform_id={platform_id} year={year} rows={rowcount}")
@@ -177,15 +269,23 @@ def get_float_dossier(platform_id: int, year: int = Query(2023, description="Yea
                     df['date'] = df['date'].dt.strftime('%Y-%m-%dT%H:%M:%SZ')
                 except Exception as _e:
                     print(f"[dossier] date formatting issue platform_id={platform_id} year={year}: {_e}")
-            return df.to_dict(orient='records')
+            return _records(df)
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+# The default world view makes many clients ask for the same box and id list at
+# once; identical concurrent requests share one execution and its encoded body.
+_single_flight = SingleFlight()
+
+def _json_body(content) -> bytes:
+    """Encode like FastAPI's default JSONResponse."""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
 # floats in a bounding box
 @app.get("/api/floats_in_box")
-def get_floats_in_box(
+async def get_floats_in_box(
         min_lat: float = Query(..., description="Minimum latitude"),
         max_lat: float = Query(..., description="Maximum latitude"),
         min_lon: float = Query(..., description="Minimum longitude"),
@@ -193,40 +293,35 @@ def get_floats_in_box(
         year: int = Query(2023, description="Year for which to return latest float positions"),
         limit: Optional[int] = Query(5000, description="Limit the number of returned floats")
 ):
-    """Return latest position for each float for a given year within bounding box."""
+    """Return latest position for each float for a given year within bounding box.
+
+    Served from the in-memory position snapshot; the database is not queried.
+    """
     year = _validate_year(year)
-    latest_table = _latest_positions_table(year)
-    query = f"""
-            SELECT platform_id, lat, lon, date
-            FROM {latest_table}
-            WHERE lat BETWEEN ? AND ?
-              AND lon BETWEEN ? AND ?
-            LIMIT ?;
-            """
-    with get_con() as c:
-        try:
-            df = c.execute(query, [min_lat, max_lat, min_lon, max_lon, limit]).fetchdf()
-            return df.to_dict(orient='records')
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    key = ("floats_in_box", year, min_lat, max_lat, min_lon, max_lon, limit)
+    body = await _single_flight.do(key, _floats_in_box_body, year, min_lat, max_lat, min_lon, max_lon, limit)
+    return Response(content=body, media_type="application/json")
+
+def _floats_in_box_body(year, min_lat, max_lat, min_lon, max_lon, limit) -> bytes:
+    snapshot = _positions_snapshot(_latest_positions_table(year))
+    idx = snapshot.in_box(min_lat, max_lat, min_lon, max_lon)
+    return _json_body(snapshot.rows(idx[:limit] if limit is not None else idx))
 
 
 @app.get("/api/float/all/platform_id")
-def get_all_platform_ids(year: int = Query(2023, description="Year for which to list platform IDs")):
+async def get_all_platform_ids(year: int = Query(2023, description="Year for which to list platform IDs")):
     year = _validate_year(year)
-    latest_table = _latest_positions_table(year)
-    query = f"SELECT platform_id FROM {latest_table} ORDER BY platform_id;"
-    with get_con() as c:
-        try:
-            df = c.execute(query).fetchdf()
-            id_list = [int(pid) for pid in df['platform_id'].tolist()]
-            return {"platform_ids": id_list, "year": year}
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    body = await _single_flight.do(("platform_ids", year), _platform_ids_body, year)
+    return Response(content=body, media_type="application/json")
+
+def _platform_ids_body(year: int) -> bytes:
+    try:
+        ids = _dataset(f"platform_ids_{year}", functools.partial(_platform_id_array, year))["platform_id"]
+        return _json_body({"platform_ids": ids.tolist(), "year": year})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @app.get("/api/floats_in_box/range")
 def get_floats_in_box_range(
@@ -240,8 +335,8 @@ def get_floats_in_box_range(
 ):
     """Return float positions across a date range spanning one or multiple years.
 
-    This unions the distinct position tables for each intersecting year and filters by date & bbox.
-    Returned rows include platform_id, lat, lon, date.
+    This filters the distinct position snapshots of each intersecting year by date & bbox.
+    Returned rows include platform_id, lat, lon, date, ordered by date.
     """
     import datetime as _dt
     try:
@@ -254,32 +349,24 @@ def get_floats_in_box_range(
     years: List[int] = list({d.year for d in (sd, ed)} | set(range(sd.year, ed.year + 1)))
     for y in years:
         _validate_year(y)
-    # Build UNION ALL query across years
-    selects = []
-    params: List = []
+    # Naive dates are UTC, like the database session
+    start_us = int(sd.replace(tzinfo=sd.tzinfo or _dt.timezone.utc).timestamp() * 1_000_000)
+    end_us = int(ed.replace(tzinfo=ed.tzinfo or _dt.timezone.utc).timestamp() * 1_000_000)
+    matches = []
     for y in sorted(years):
-        table = _distinct_positions_table(y)
-        selects.append(f"SELECT platform_id, lat, lon, date FROM {table} ")
-    union_query = " UNION ALL ".join(selects)
-    final_query = f"""
-        WITH unioned AS (
-            {union_query}
-        )
-        SELECT platform_id, lat, lon, date
-        FROM unioned
-        WHERE lat BETWEEN ? AND ?
-          AND lon BETWEEN ? AND ?
-          AND date BETWEEN ? AND ?
-        ORDER BY date
-        LIMIT ?;
-    """
-    params.extend([min_lat, max_lat, min_lon, max_lon, sd, ed, limit])
-    with get_con() as c:
-        try:
-            df = c.execute(final_query, params).fetchdf()
-            return {"count": len(df), "start_date": start_date, "end_date": end_date, "positions": df.to_dict(orient='records')}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+        snapshot = _positions_snapshot(_distinct_positions_table(y))
+        matches.append((snapshot, snapshot.in_box(min_lat, max_lat, min_lon, max_lon, start_us, end_us)))
+    dates = np.concatenate([snapshot.date_us[idx] for snapshot, idx in matches])
+    order = np.argsort(dates, kind="stable")[:limit]
+    # Only the rows that survive the limit are turned into dicts
+    positions = [None] * len(order)
+    start = 0
+    for snapshot, idx in matches:
+        slots = np.flatnonzero((order >= start) & (order < start + len(idx)))
+        for slot, row in zip(slots.tolist(), snapshot.rows(idx[order[slots] - start])):
+            positions[slot] = row
+        start += len(idx)
+    return {"count": len(positions), "start_date": start_date, "end_date": end_date, "positions": positions}
 
 @app.get("/api/float/{platform_id}/dossier_range")
 def get_float_dossier_range(platform_id: int,
@@ -297,28 +384,29 @@ def get_float_dossier_range(platform_id: int,
     years = list(range(sd.year, ed.year + 1))
     for y in years:
         _validate_year(y)
-    selects = []
-    for y in years:
-        argotable = _argo_table(y)
-        selects.append(f"SELECT date, depth_m, temp_c, sal_psu FROM {argotable} WHERE platform_id = ?")
-    union_query = " UNION ALL ".join(selects)
-    final_query = f"""
-        WITH measurements AS (
-            {union_query}
-        )
-        SELECT date, depth_m, temp_c, sal_psu
-        FROM measurements
-        WHERE date BETWEEN ? AND ?
-        ORDER BY date, depth_m
-    """
-    params = [platform_id] * len(selects) + [sd, ed]
     with get_con() as c:
         try:
+            selects = []
+            for y in years:
+                argotable = _argo_table(y)
+                columns, valid = _measurement_columns(c, y)
+                selects.append(f"SELECT date, {columns} FROM {argotable} WHERE platform_id = ?{valid}")
+            union_query = " UNION ALL ".join(selects)
+            final_query = f"""
+                WITH measurements AS (
+                    {union_query}
+                )
+                SELECT date, depth_m, temp_c, sal_psu
+                FROM measurements
+                WHERE date BETWEEN ? AND ?
+                ORDER BY date, depth_m
+            """
+            params = [platform_id] * len(selects) + [sd, ed]
             df = c.execute(final_query, params).fetchdf()
             if df.empty:
                 raise HTTPException(status_code=404, detail=f"No dossier data for float {platform_id} in range")
             df['date'] = df['date'].dt.strftime('%Y-%m-%dT%H:%M:%SZ')
-            return {"platform_id": platform_id, "start_date": start_date, "end_date": end_date, "count": len(df), "profiles": df.to_dict(orient='records')}
+            return {"platform_id": platform_id, "start_date": start_date, "end_date": end_date, "count": len(df), "profiles": _records(df)}
         except HTTPException:
             raise
         except Exception as e:
@@ -327,8 +415,13 @@ def get_float_dossier_range(platform_id: int,
 @app.get("/api/float/{platform_id}/path_range")
 def get_float_path_range(platform_id: int,
                          start_date: str = Query(..., description="Start ISO date (YYYY-MM-DD)"),
-                         end_date: str = Query(..., description="End ISO date (YYYY-MM-DD)")):
-    """Return a float's trajectory (distinct positions) across a date range spanning multiple years."""
+                         end_date: str = Query(..., description="End ISO date (YYYY-MM-DD)"),
+                         tolerance_km: Optional[float] = PATH_TOLERANCE_QUERY, zoom: Optional[float] = PATH_ZOOM_QUERY):
+    """Return a float's trajectory (distinct positions) across a date range spanning multiple years.
+
+    With `tolerance_km` or `zoom` the trajectory is simplified; the first and last
+    positions in the range are always kept.
+    """
     import datetime as _dt
     try:
         sd = _dt.datetime.fromisoformat(start_date)
@@ -340,23 +433,33 @@ def get_float_path_range(platform_id: int,
     years = list(range(sd.year, ed.year + 1))
     for y in years:
         _validate_year(y)
-    selects = []
-    for y in years:
-        table = _distinct_positions_table(y)
-        selects.append(f"SELECT date, lat, lon FROM {table} WHERE platform_id = ?")
-    union_query = " UNION ALL ".join(selects)
-    final_query = f"""
-        WITH paths AS (
-            {union_query}
-        )
-        SELECT date, lat, lon
-        FROM paths
-        WHERE date BETWEEN ? AND ?
-        ORDER BY date
-    """
-    params = [platform_id] * len(selects) + [sd, ed]
+    tolerance = _path_tolerance(tolerance_km, zoom)
     with get_con() as c:
         try:
+            selects = []
+            for y in years:
+                table = _distinct_positions_table(y)
+                # Years without precomputed significance are returned in full
+                significance = "significance_km" if _has_path_significance(c, y) else "'Infinity'::DOUBLE"
+                selects.append(f"SELECT date, lat, lon, {significance} AS significance_km FROM {table} WHERE platform_id = ?")
+            union_query = " UNION ALL ".join(selects)
+            simplify = ""
+            params = [platform_id] * len(selects) + [sd, ed]
+            if tolerance is not None:
+                simplify = """
+                QUALIFY significance_km > ?
+                    OR ROW_NUMBER() OVER (ORDER BY date) = 1
+                    OR ROW_NUMBER() OVER (ORDER BY date DESC) = 1"""
+                params.append(tolerance)
+            final_query = f"""
+                WITH paths AS (
+                    {union_query}
+                )
+                SELECT date, lat, lon
+                FROM paths
+                WHERE date BETWEEN ? AND ?{simplify}
+                ORDER BY date
+            """
             df = c.execute(final_query, params).fetchdf()
             if df.empty:
                 raise HTTPException(status_code=404, detail=f"No path data for float {platform_id} in range")
@@ -367,3 +470,596 @@ def get_float_path_range(platform_id: int,
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+
+
+# --- 3. SPATIAL SEARCH ---
+# Grid indexes over float positions, built per table on first use and rebuilt when
+# the database file changes. Latest positions are indexed at startup.
+_spatial_indexes = {}
+_spatial_lock = threading.Lock()
+
+def _db_version():
+    try:
+        st = os.stat(DB_PATH)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+# Hot read-mostly datasets (position snapshots, platform ids, latest profiles,
+# climatology grids) are dicts of NumPy arrays. When `snapshots.py` has exported a
+# snapshot of the current database they are memory-mapped from it, so all worker
+# processes share one copy in the page cache; otherwise each process builds them
+# from the database. Both are replaced as soon as the database file changes.
+_datasets = {}
+_dataset_lock = threading.Lock()
+_build_locks = {}
+_mapped = {"path": None, "snapshot": None}
+
+def _mapped_dataset(name: str):
+    """Arrays of `name` from the current exported snapshot, or None if there is none for this database."""
+    path = snapshots.current_path()
+    with _dataset_lock:
+        if _mapped["path"] != path:
+            try:
+                _mapped["snapshot"] = snapshots.open_current() if path else None
+            except Exception as e:
+                print(f"[snapshots] could not open {path}: {e}")
+                _mapped["snapshot"] = None
+            _mapped["path"] = path
+        mapped = _mapped["snapshot"]
+        if mapped is None or mapped.db_version != _db_version():
+            return None
+        return mapped.get(name)
+
+def _dataset(name: str, build):
+    """Arrays of `name`, mapped from the exported snapshot or built once per database version."""
+    arrays = _mapped_dataset(name)
+    if arrays is not None:
+        return arrays
+    version = _db_version()
+    with _dataset_lock:
+        cached = _datasets.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        build_lock = _build_locks.setdefault(name, threading.Lock())
+    # One thread builds; the others wait for it instead of querying the database too
+    with build_lock:
+        with _dataset_lock:
+            cached = _datasets.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        arrays = build()
+        with _dataset_lock:
+            _datasets[name] = (version, arrays)
+    return arrays
+
+def _dataset_name(table: str) -> str:
+    return table.split(".")[-1]
+
+def _positions_arrays(table: str) -> dict:
+    with get_con() as c:
+        data = c.execute(f"SELECT platform_id, lat, lon, epoch_us(date) AS date_us FROM {table}").fetchnumpy()
+    snapshot = PositionSnapshot(data["platform_id"], data["lat"], data["lon"], data["date_us"])
+    print(f"[spatial] snapshot of {len(snapshot)} positions of {table}")
+    return snapshot.arrays()
+
+def _platform_id_array(year: int) -> dict:
+    with get_con() as c:
+        data = c.execute(f"SELECT platform_id FROM {_latest_positions_table(year)} ORDER BY platform_id").fetchnumpy()
+    return {"platform_id": np.asarray(data["platform_id"], dtype=np.int64)}
+
+def _profile_arrays(year: int) -> dict:
+    """Latest profile of every float as one depth-sorted block per platform_id (CSR layout)."""
+    argotable = _argo_table(year)
+    with get_con() as c:
+        columns, valid = _measurement_columns(c, year)
+        data = c.execute(f"""
+            WITH latest AS (
+                SELECT platform_id, MAX(date) AS max_date FROM {argotable} GROUP BY platform_id
+            )
+            SELECT a.platform_id, {columns}
+            FROM {argotable} a
+            JOIN latest l ON a.platform_id = l.platform_id AND a.date = l.max_date
+            WHERE TRUE{valid}
+            ORDER BY 1, 2
+        """).fetchnumpy()
+    ids, first = np.unique(np.asarray(data["platform_id"], dtype=np.int64), return_index=True)
+    arrays = {"platform_id": ids, "offsets": np.append(first, len(data["platform_id"]))}
+    for name in ("depth_m", "temp_c", "sal_psu"):
+        arrays[name] = np.ma.filled(np.ma.asarray(data[name], dtype=np.float64), np.nan)
+    return arrays
+
+def snapshot_datasets() -> dict:
+    """Dataset name -> builder, for everything the API can serve from an exported snapshot."""
+    builders = {}
+    for year in sorted(ALLOWED_YEARS):
+        for table in (_latest_positions_table(year), _distinct_positions_table(year)):
+            builders[_dataset_name(table)] = functools.partial(_positions_arrays, table)
+        builders[f"platform_ids_{year}"] = functools.partial(_platform_id_array, year)
+        builders[f"latest_profiles_{year}"] = functools.partial(_profile_arrays, year)
+        builders[f"argo{year}_grid"] = functools.partial(_grid_arrays, year)
+    return builders
+
+def _spatial_index(table: str) -> SphereGridIndex:
+    version = _db_version()
+    with _spatial_lock:
+        cached = _spatial_indexes.get(table)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    with get_con() as c:
+        # Dates are served as UTC ISO strings, like the dossier endpoints
+        c.execute("SET TimeZone = 'UTC'")
+        data = c.execute(f"""
+            SELECT platform_id, lat, lon, strftime(date::TIMESTAMP, '%Y-%m-%dT%H:%M:%SZ') AS date
+            FROM {table}
+        """).fetchnumpy()
+    index = SphereGridIndex(data["lat"], data["lon"], {"platform_id": data["platform_id"], "date": data["date"]})
+    with _spatial_lock:
+        _spatial_indexes[table] = (version, index)
+    print(f"[spatial] indexed {len(index)} positions of {table} ({index.cells_per_axis}^3 grid)")
+    return index
+
+def _positions_index(year: int, history: bool) -> SphereGridIndex:
+    table = _distinct_positions_table(year) if history else _latest_positions_table(year)
+    try:
+        return _spatial_index(table)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+# Viewport queries (floats_in_box) read the same tables through a lat/lon bucketed
+# snapshot, one of the shared datasets above.
+def _positions_snapshot(table: str) -> PositionSnapshot:
+    try:
+        return PositionSnapshot.from_arrays(_dataset(_dataset_name(table), functools.partial(_positions_arrays, table)))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@app.on_event("startup")
+def load_position_snapshots():
+    for year in sorted(ALLOWED_YEARS):
+        for table in (_latest_positions_table(year), _distinct_positions_table(year)):
+            try:
+                _positions_snapshot(table)
+            except Exception as e:
+                print(f"[spatial] could not snapshot {table}: {getattr(e, 'detail', e)}")
+
+@app.on_event("startup")
+def build_spatial_indexes():
+    for year in sorted(ALLOWED_YEARS):
+        try:
+            _spatial_index(_latest_positions_table(year))
+        except Exception as e:
+            print(f"[spatial] could not index latest positions for {year}: {e}")
+
+@app.get("/api/floats/nearest")
+def get_nearest_floats(
+        lat: float = Query(..., ge=-90, le=90, description="Latitude of the point of interest"),
+        lon: float = Query(..., ge=-180, le=180, description="Longitude of the point of interest"),
+        k: int = Query(10, ge=1, le=1000, description="Number of floats to return"),
+        year: int = Query(2023, description="Year of float positions"),
+        history: bool = Query(False, description="Search every position of the year (closest fix per float) instead of latest positions"),
+):
+    """The k floats closest to a point by great-circle distance, nearest first."""
+    started = time.perf_counter()
+    year = _validate_year(year)
+    index = _positions_index(year, history)
+    idx, dist = index.nearest(lat, lon, k, unique_by="platform_id" if history else None)
+    floats = index.rows(idx, dist, ("platform_id", "lat", "lon", "date"))
+    return {"lat": lat, "lon": lon, "year": year, "count": len(floats), "floats": floats,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+@app.get("/api/floats/radius")
+def get_floats_in_radius(
+        lat: float = Query(..., ge=-90, le=90, description="Latitude of the point of interest"),
+        lon: float = Query(..., ge=-180, le=180, description="Longitude of the point of interest"),
+        radius_km: float = Query(..., gt=0, le=20016, description="Great-circle search radius in km"),
+        year: int = Query(2023, description="Year of float positions"),
+        history: bool = Query(False, description="Return every position of the year in range instead of latest positions"),
+        limit: int = Query(5000, ge=1, le=1000000, description="Maximum number of positions returned"),
+):
+    """Float positions within a great-circle radius of a point, nearest first."""
+    started = time.perf_counter()
+    year = _validate_year(year)
+    index = _positions_index(year, history)
+    idx, dist = index.within(lat, lon, radius_km, limit=limit)
+    floats = index.rows(idx, dist, ("platform_id", "lat", "lon", "date"))
+    return {"lat": lat, "lon": lon, "radius_km": radius_km, "year": year, "count": len(floats), "floats": floats,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+# --- 4. CLIMATOLOGY GRIDS ---
+# Monthly means on standard depths, precomputed by apps/llm/ingest.py (--steps grids)
+# into argo{year}_grid. Each year is a shared dataset of float32 layers
+# (variable x depth x month x lat x lon, NaN = no data); requests only slice and
+# encode a layer.
+GRID_DEG = 1.0  # must match ingest.GRID_DEG
+GRID_VARIABLES = {"temp_c": "temp_c", "temp": "temp_c", "temperature": "temp_c",
+                  "sal_psu": "sal_psu", "sal": "sal_psu", "salinity": "sal_psu"}
+
+def _grid_arrays(year: int) -> dict:
+    """argo{year}_grid unpacked into `layers[variable, depth, month - 1, lat_idx, lon_idx]`."""
+    with get_con() as c:
+        try:
+            data = c.execute(f"""
+                SELECT variable, depth_m, month, lat_idx, lon_idx, mean
+                FROM main.argo{year}_grid
+            """).fetchnumpy()
+        except duckdb.CatalogException:
+            raise HTTPException(status_code=404, detail=f"No climatology grid for {year}; run ingest.py --steps grids")
+    variables = sorted(set(data["variable"].tolist()))
+    depths = sorted(set(data["depth_m"].tolist()))
+    rows, cols = int(round(180 / GRID_DEG)), int(round(360 / GRID_DEG))
+    layers = np.full((len(variables), len(depths), 12, rows, cols), np.nan, dtype=np.float32)
+    var_idx = np.searchsorted(np.array(variables, dtype=object), data["variable"])
+    depth_idx = np.searchsorted(depths, data["depth_m"])
+    layers[var_idx, depth_idx, data["month"].astype(np.int64) - 1, data["lat_idx"], data["lon_idx"]] = data["mean"]
+    print(f"[grid] loaded {len(data['mean'])} cells of argo{year}_grid ({layers.nbytes // 2**20} MiB)")
+    return {"variables": np.array(variables), "depths": np.array(depths, dtype=np.int64), "layers": layers}
+
+def _load_grid(year: int):
+    """(variables, depths, layers) of the year's climatology grid."""
+    grid = _dataset(f"argo{year}_grid", functools.partial(_grid_arrays, year))
+    return grid["variables"].tolist(), grid["depths"].tolist(), grid["layers"]
+
+@app.on_event("startup")
+def load_climatology_grids():
+    for year in sorted(ALLOWED_YEARS):
+        try:
+            _load_grid(year)
+        except Exception as e:
+            print(f"[grid] no climatology grid for {year}: {getattr(e, 'detail', e)}")
+
+@app.get("/api/grid")
+def get_grid_layer(
+        var: str = Query("temp_c", description="Variable: temp_c (temperature) or sal_psu (salinity)"),
+        depth: int = Query(0, ge=0, description="Standard depth in metres (0, 10, 50, 100, 200, 500, 1000, 2000)"),
+        year: int = Query(2023, description="Year of the climatology"),
+        month: int = Query(..., ge=1, le=12, description="Month (1-12)"),
+):
+    """One global layer of monthly means as packed little-endian float32.
+
+    The body is a row-major (rows, cols) array, row 0 at the southern edge and
+    column 0 at -180°; cells without data are NaN. Shape, origin and cell size are
+    in the X-Grid-* response headers.
+    """
+    started = time.perf_counter()
+    year = _validate_year(year)
+    variable = GRID_VARIABLES.get(var.lower())
+    if variable is None:
+        raise HTTPException(status_code=400, detail=f"Unknown variable '{var}'. Valid: {sorted(set(GRID_VARIABLES.values()))}")
+    try:
+        variables, depths, layers = _load_grid(year)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    if variable not in variables:
+        raise HTTPException(status_code=404, detail=f"No {variable} grid for {year}")
+    if depth not in depths:
+        raise HTTPException(status_code=400, detail=f"Depth {depth} m is not gridded. Valid depths: {depths}")
+    layer = layers[variables.index(variable), depths.index(depth), month - 1]
+    body = layer.astype("<f4", copy=False).tobytes()
+    return Response(content=body, media_type="application/octet-stream", headers={
+        "X-Grid-Shape": f"{layer.shape[0]},{layer.shape[1]}",
+        "X-Grid-Origin": "-90,-180",
+        "X-Grid-Resolution": str(GRID_DEG),
+        "X-Grid-Dtype": "float32-le",
+        "X-Grid-Variable": variable,
+        "X-Grid-Depth": str(depth),
+        "X-Grid-Cells": str(int(np.count_nonzero(~np.isnan(layer)))),
+        "X-Elapsed-Ms": str(round((time.perf_counter() - started) * 1000, 3)),
+    })
+
+
+# --- 5. BULK EXPORT ---
+# Subsets of the measurement tables selected by box, dates, depths, region or float.
+# Filters are pushed into one DuckDB query over the intersecting years; results are
+# streamed in chunks, never materialized as Python records.
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+EXPORT_BATCH_ROWS = 65536
+EXPORT_CHUNK_BYTES = 1 << 20
+
+def _date_range(start_date: Optional[str], end_date: Optional[str]):
+    """(start, end exclusive, years) for optional inclusive YYYY-MM-DD bounds; open bounds span all years."""
+    try:
+        sd = datetime.datetime.fromisoformat(start_date) if start_date else None
+        ed = datetime.datetime.fromisoformat(end_date) + datetime.timedelta(days=1) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if sd is not None and ed is not None and ed <= sd:
+        raise HTTPException(status_code=400, detail="end_date must be >= start_date")
+    first = sd.year if sd is not None else min(ALLOWED_YEARS)
+    last = (ed - datetime.timedelta(microseconds=1)).year if ed is not None else max(ALLOWED_YEARS)
+    years = [y for y in range(first, last + 1) if y in ALLOWED_YEARS]
+    if not years:
+        raise HTTPException(status_code=400, detail=f"No data in that date range. Valid years: {sorted(ALLOWED_YEARS)}")
+    return sd, ed, years
+
+def _region_condition(c, region: str):
+    """WHERE term for a region name or alias: region_id when ingest built the dimension, else region_name."""
+    try:
+        row = c.execute(
+            "SELECT region_id FROM regions WHERE lower(name) = lower(?) OR list_contains(aliases, lower(?))",
+            [region, region]
+        ).fetchone()
+    except duckdb.CatalogException:
+        return "region_name ILIKE ?", [region]
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Unknown region '{region}'")
+    return "region_id = ?", [row[0]]
+
+def _subset_query(c, years, select, min_lat=None, max_lat=None, min_lon=None, max_lon=None,
+                  start=None, end=None, min_depth=None, max_depth=None, region=None, platform_id=None):
+    """(sql, params) selecting `select` from the filtered rows of every year in `years`.
+
+    `select` is a select list, or a function of the year returning one.
+    """
+    region_term = _region_condition(c, region) if region else None
+    selects, params = [], []
+    for year in years:
+        depth = "depth_m_good" if _has_clean_columns(c, year) else "depth_m"
+        terms, values = [], []
+        for column, low, high in (("lat", min_lat, max_lat), ("lon", min_lon, max_lon), (depth, min_depth, max_depth)):
+            if low is not None:
+                terms.append(f"{column} >= ?")
+                values.append(low)
+            if high is not None:
+                terms.append(f"{column} <= ?")
+                values.append(high)
+        if start is not None:
+            terms.append("date >= ?")
+            values.append(start)
+        if end is not None:
+            terms.append("date < ?")
+            values.append(end)
+        if region_term:
+            terms.append(region_term[0])
+            values.extend(region_term[1])
+        if platform_id is not None:
+            terms.append("platform_id = ?")
+            values.append(platform_id)
+        where = f" WHERE {' AND '.join(terms)}" if terms else ""
+        columns = select(year) if callable(select) else select
+        selects.append(f"SELECT {columns} FROM {_argo_table(year)}{where}")
+        params.extend(values)
+    # Years ingested at different times may differ in derived columns
+    return " UNION ALL BY NAME ".join(selects), params
+
+def _export_columns(c, years, columns: Optional[str]):
+    """Select list for `columns`: "*", or a function of the year for `_subset_query`.
+
+    A derived column (`*_good`, `region_id`) that a year has not been ingested with
+    yet is exported as NULL for that year's rows.
+    """
+    if not columns:
+        return "*"
+    available = {year: set() for year in years}
+    for table, column in c.execute(
+        "SELECT table_name, column_name FROM duckdb_columns() WHERE table_name IN ? AND schema_name = 'main'",
+        [[f"argo{year}" for year in years]]
+    ).fetchall():
+        available[int(table[len("argo"):])].add(column)
+    known = set().union(*available.values())
+    requested = [name.strip() for name in columns.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in known]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns {unknown}. Available: {sorted(known)}")
+
+    def select(year):
+        return ", ".join(
+            f'"{name}"' if name in available[year] else f'NULL AS "{name}"' for name in requested
+        )
+    return select
+
+def _stream_file(path: str, cleanup: str):
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(EXPORT_CHUNK_BYTES):
+                yield chunk
+    finally:
+        shutil.rmtree(cleanup, ignore_errors=True)
+
+def _stream_arrow(c, reader):
+    """Arrow IPC stream of the result's record batches."""
+    import io
+    import pyarrow as pa
+    try:
+        buffer = io.BytesIO()
+        with pa.ipc.new_stream(buffer, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()  # end-of-stream marker
+    finally:
+        c.close()
+
+@app.get("/api/export")
+def export_measurements(
+        format: str = Query("parquet", description="parquet (zstd), csv or arrow (IPC stream; needs pyarrow)"),
+        min_lat: Optional[float] = Query(None, ge=-90, le=90), max_lat: Optional[float] = Query(None, ge=-90, le=90),
+        min_lon: Optional[float] = Query(None, ge=-180, le=180), max_lon: Optional[float] = Query(None, ge=-180, le=180),
+        start_date: Optional[str] = Query(None, description="First day (YYYY-MM-DD, inclusive)"),
+        end_date: Optional[str] = Query(None, description="Last day (YYYY-MM-DD, inclusive)"),
+        min_depth: Optional[float] = Query(None, description="Minimum depth in metres"),
+        max_depth: Optional[float] = Query(None, description="Maximum depth in metres"),
+        region: Optional[str] = Query(None, description="Region name or alias"),
+        platform_id: Optional[int] = Query(None, description="Single float"),
+        columns: Optional[str] = Query(None, description="Comma-separated columns (default: all)"),
+        limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows"),
+):
+    """Stream a filtered subset of the measurement tables as a file.
+
+    Parquet and CSV are written by DuckDB's COPY into a temporary spool file (a
+    Parquet footer comes last) and streamed from disk; Arrow streams record batches.
+    Timestamps are rendered in UTC.
+    """
+    format = format.lower()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}'. Valid: {sorted(EXPORT_FORMATS)}")
+    if format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Arrow export needs pyarrow on the server; use parquet or csv")
+    sd, ed, years = _date_range(start_date, end_date)
+    media_type, extension = EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="argo_{years[0]}_{years[-1]}.{extension}"'}
+
+    try:
+        c = duckdb.connect(DB_PATH, read_only=True)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+    streaming = False
+    try:
+        # TIMESTAMPTZ output should not depend on the server's local time zone
+        c.execute("SET TimeZone = 'UTC'")
+        select = _export_columns(c, years, columns)
+        query, params = _subset_query(c, years, select, min_lat, max_lat, min_lon, max_lon,
+                                      sd, ed, min_depth, max_depth, region, platform_id)
+        if limit is not None:
+            query = f"SELECT * FROM ({query}) LIMIT {int(limit)}"
+
+        if format in ("parquet", "csv"):
+            spool_dir = tempfile.mkdtemp(prefix="argo-export-")
+            path = os.path.join(spool_dir, f"export.{extension}")
+            options = "FORMAT parquet, COMPRESSION zstd" if format == "parquet" else "FORMAT csv, HEADER"
+            try:
+                c.execute(f"COPY ({query}) TO '{path.replace("'", "''")}' ({options})", params)
+            except Exception:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+                raise
+            headers["Content-Length"] = str(os.path.getsize(path))
+            return StreamingResponse(_stream_file(path, spool_dir), media_type=media_type, headers=headers)
+
+        c.execute(query, params)
+        streaming = True
+        body = _stream_arrow(c, c.fetch_record_batch(EXPORT_BATCH_ROWS))
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    finally:
+        # Streaming bodies close the connection when they finish
+        if not streaming:
+            c.close()
+
+
+# --- 6. TIME-SERIES STATISTICS ---
+STATS_VARIABLES = {"temp_c": ("temp_c", "temp_qc"), "temp": ("temp_c", "temp_qc"), "temperature": ("temp_c", "temp_qc"),
+                   "sal_psu": ("sal_psu", "psal_qc"), "sal": ("sal_psu", "psal_qc"), "salinity": ("sal_psu", "psal_qc")}
+STATS_BUCKETS = ("day", "week", "month")
+QC_GOOD_MAX = 3  # must match ingest.QC_GOOD_MAX
+MAX_DEPTH_BANDS = 16
+
+def _parse_depth_bands(depth_bands: str):
+    bands = []
+    try:
+        for part in depth_bands.split(","):
+            low, high = (float(v) for v in part.strip().split("-"))
+            if not 0 <= low < high:
+                raise ValueError(part)
+            bands.append((low, high))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="depth_bands must look like '0-100,100-500' (metres, low < high)")
+    if not bands or len(bands) > MAX_DEPTH_BANDS:
+        raise HTTPException(status_code=400, detail=f"Give 1 to {MAX_DEPTH_BANDS} depth bands")
+    return bands
+
+def _parse_percentiles(percentiles: str):
+    try:
+        values = [float(v) for v in percentiles.split(",") if v.strip()]
+    except ValueError:
+        values = None
+    if not values or not all(0 <= v <= 100 for v in values):
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers in [0, 100]")
+    # Each percentile is one p<q> key, so repeats (e.g. "50,50") are dropped
+    return list(dict.fromkeys(values))
+
+@app.get("/api/stats/timeseries")
+def get_timeseries_stats(
+        var: str = Query("temp_c", description="Variable: temp_c (temperature) or sal_psu (salinity)"),
+        bucket: str = Query("month", description="Time bucket: day, week (starting Monday) or month"),
+        depth_bands: str = Query("0-100", description="Depth bands in metres, e.g. '0-100,100-500' (low inclusive, high exclusive)"),
+        min_lat: Optional[float] = Query(None, ge=-90, le=90), max_lat: Optional[float] = Query(None, ge=-90, le=90),
+        min_lon: Optional[float] = Query(None, ge=-180, le=180), max_lon: Optional[float] = Query(None, ge=-180, le=180),
+        region: Optional[str] = Query(None, description="Region name or alias"),
+        start_date: Optional[str] = Query(None, description="First day (YYYY-MM-DD, inclusive)"),
+        end_date: Optional[str] = Query(None, description="Last day (YYYY-MM-DD, inclusive)"),
+        percentiles: str = Query("10,50,90", description="Comma-separated percentiles to compute"),
+):
+    """Count, mean, standard deviation and percentiles of a QC-good variable per time bucket and depth band.
+
+    One aggregate query over the filtered rows of every intersecting year; each
+    depth band is returned as parallel arrays (`time`, `count`, `mean`, ...).
+    """
+    started = time.perf_counter()
+    if var.lower() not in STATS_VARIABLES:
+        raise HTTPException(status_code=400, detail=f"Unknown variable '{var}'. Valid: temp_c, sal_psu")
+    variable, qc = STATS_VARIABLES[var.lower()]
+    bucket = bucket.lower()
+    if bucket not in STATS_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Unknown bucket '{bucket}'. Valid: {list(STATS_BUCKETS)}")
+    bands = _parse_depth_bands(depth_bands)
+    quantiles = _parse_percentiles(percentiles)
+    sd, ed, years = _date_range(start_date, end_date)
+
+    with get_con() as c:
+        try:
+            def measurements(year):
+                if _has_clean_columns(c, year):
+                    return f"date, depth_m_good AS depth_m, {variable}_good AS value"
+                # Same rule ingest uses for the *_good columns
+                return (f"date, CASE WHEN NOT ISNAN(depth_m) AND pres_qc < {QC_GOOD_MAX} THEN depth_m END AS depth_m, "
+                        f"CASE WHEN NOT ISNAN({variable}) AND {qc} < {QC_GOOD_MAX} THEN {variable} END AS value")
+
+            rows, params = _subset_query(c, years, measurements, min_lat, max_lat, min_lon, max_lon, sd, ed,
+                                         min(b[0] for b in bands), max(b[1] for b in bands), region)
+            band_values = ", ".join(f"({i}, {low!r}, {high!r})" for i, (low, high) in enumerate(bands))
+            quantile_list = ", ".join(repr(q / 100) for q in quantiles)
+            c.execute("SET TimeZone = 'UTC'")
+            data = c.execute(f"""
+                WITH measurements AS ({rows}),
+                bands(band, low, high) AS (VALUES {band_values})
+                SELECT b.band,
+                    strftime(date_trunc('{bucket}', m.date), '%Y-%m-%d') AS time,
+                    COUNT(*) AS count,
+                    AVG(m.value) AS mean,
+                    STDDEV_SAMP(m.value) AS std,
+                    QUANTILE_CONT(m.value, [{quantile_list}]) AS quantiles
+                FROM measurements m
+                JOIN bands b ON m.depth_m >= b.low AND m.depth_m < b.high
+                WHERE m.value IS NOT NULL
+                GROUP BY ALL
+                ORDER BY b.band, time
+            """, params).fetchall()
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    def rounded(value):
+        return None if value is None or value != value else round(value, 4)
+
+    series = [{"depth_band": [low, high], "time": [], "count": [], "mean": [], "std": [],
+               **{f"p{q:g}": [] for q in quantiles}} for low, high in bands]
+    for band, bucket_start, count, mean, std, values in data:
+        out = series[band]
+        out["time"].append(bucket_start)
+        out["count"].append(count)
+        out["mean"].append(rounded(mean))
+        out["std"].append(rounded(std))
+        for q, value in zip(quantiles, values):
+            out[f"p{q:g}"].append(rounded(value))
+    return {"variable": variable, "bucket": bucket, "years": years, "series": series,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
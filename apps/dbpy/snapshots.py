@@ -0,0 +1,125 @@
+"""Memory-mapped snapshots of the API's hot, read-mostly datasets.
+
+Every API worker would otherwise load its own copy of the position snapshots,
+latest profiles, platform id lists and climatology grids. This exports them once
+as plain `.npy` files; workers map them read-only (`np.load(mmap_mode="r")`), so
+all processes share one copy through the OS page cache:
+
+    python snapshots.py                 # after (re)loading or ingesting argo.db
+    uvicorn main:app --workers 4
+
+A snapshot is a directory of `<dataset>.<array>.npy` files plus `manifest.json`.
+`CURRENT` names the live one and is replaced atomically, so workers never see a
+half-written export. Each manifest records the database version it was built
+from; workers ignore a snapshot that no longer matches argo.db and fall back to
+building the datasets in memory.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+SNAPSHOT_DIR = './LOCAL/Resources/snapshots'
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+
+
+class MappedSnapshot:
+    """One exported snapshot; `get(name)` maps a dataset's arrays on first use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.db_version = tuple(self.manifest["db_version"]) if self.manifest.get("db_version") else None
+        self._datasets = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.manifest["datasets"]
+
+    def get(self, name: str) -> Optional[Dict[str, np.ndarray]]:
+        if name not in self:
+            return None
+        if name not in self._datasets:
+            self._datasets[name] = {
+                array: np.load(os.path.join(self.path, f"{name}.{array}.npy"), mmap_mode="r", allow_pickle=False)
+                for array in self.manifest["datasets"][name]
+            }
+        return self._datasets[name]
+
+
+def current_path(root: str = SNAPSHOT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT), encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(root, name) if name else None
+
+
+def open_current(root: str = SNAPSHOT_DIR) -> Optional[MappedSnapshot]:
+    path = current_path(root)
+    if path is None or not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+    return MappedSnapshot(path)
+
+
+def write_snapshot(datasets: Dict[str, Dict[str, np.ndarray]], db_version, root: str = SNAPSHOT_DIR, keep: int = 2) -> str:
+    """Write `datasets` as a new snapshot, make it current and prune all but the `keep` newest."""
+    os.makedirs(root, exist_ok=True)
+    name = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    for dataset, arrays in datasets.items():
+        for array, values in arrays.items():
+            # Contiguous, non-object arrays map without copies or pickling
+            np.save(os.path.join(path, f"{dataset}.{array}.npy"), np.ascontiguousarray(values), allow_pickle=False)
+    manifest = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "db_version": list(db_version) if db_version else None,
+        "datasets": {dataset: sorted(arrays) for dataset, arrays in datasets.items()},
+    }
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    tmp = os.path.join(root, f".{CURRENT}.{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, CURRENT))
+
+    # Workers may still map the previous snapshot until they notice the switch
+    snapshots = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)) and not d.startswith("."))
+    for old in snapshots[:-keep] if keep > 0 else []:
+        if old != name:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the API's hot datasets for memory-mapped serving.")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="Snapshot root directory")
+    parser.add_argument("--keep", type=int, default=2, help="Snapshots to keep, including the new one")
+    args = parser.parse_args()
+
+    import main as api
+
+    version = api._db_version()
+    datasets = {}
+    for name, build in api.snapshot_datasets().items():
+        try:
+            datasets[name] = build()
+        except Exception as e:
+            print(f"[snapshots] skipped {name}: {getattr(e, 'detail', e)}")
+            continue
+        size = sum(a.nbytes for a in datasets[name].values())
+        print(f"[snapshots] {name}: {size / 2**20:.1f} MiB")
+    path = write_snapshot(datasets, version, args.out, args.keep)
+    print(f"[snapshots] wrote {len(datasets)} datasets to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from utils.positions import PositionSnapshot, iso_dates
+
+DAY_US = 86_400 * 1_000_000
+START_US = 1_672_531_200 * 1_000_000  # 2023-01-01
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(3)
+    n = 4000
+    lat = rng.uniform(-90, 90, n)
+    lon = rng.uniform(-180, 180, n)
+    # Points on bucket edges and on the extremes of the grid
+    lat[:8] = [-90, 90, 0, 0, 10, 10, -0.0, 45.5]
+    lon[:8] = [-180, 180, -180, 180, 20, 21, 0, -0.5]
+    lat[8], lon[9] = np.nan, np.inf
+    platform_id = rng.integers(1_900_000, 1_900_300, n)
+    date_us = START_US + rng.integers(0, 365, n) * DAY_US
+    return platform_id, lat, lon, date_us
+
+
+@pytest.fixture(scope="module")
+def snapshot(data):
+    return PositionSnapshot(*data)
+
+
+def brute(data, min_lat, max_lat, min_lon, max_lon, start_us=None, end_us=None):
+    platform_id, lat, lon, date_us = data
+    keep = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+    if start_us is not None:
+        keep &= date_us >= start_us
+    if end_us is not None:
+        keep &= date_us <= end_us
+    return sorted(zip(platform_id[keep].tolist(), lat[keep].tolist(), lon[keep].tolist(), date_us[keep].tolist()))
+
+
+def found(snapshot, idx):
+    return sorted(zip(snapshot.platform_id[idx].tolist(), snapshot.lat[idx].tolist(),
+                      snapshot.lon[idx].tolist(), snapshot.date_us[idx].tolist()))
+
+
+BOXES = [
+    (-90, 90, -180, 180),
+    (10, 10, 20, 21),        # degenerate box on bucket edges
+    (-0.5, 0.5, -0.5, 0.5),
+    (89, 90, 170, 180),
+    (-90, -80, -180, -170),
+    (12.3, 47.9, -33.3, 101.7),
+    (0, 0, -180, 180),
+]
+
+
+@pytest.mark.parametrize("box", BOXES)
+def test_in_box_matches_brute_force(snapshot, data, box):
+    assert found(snapshot, snapshot.in_box(*box)) == brute(data, *box)
+
+
+@pytest.mark.parametrize("box", BOXES)
+def test_in_box_filters_dates_inclusively(snapshot, data, box):
+    start_us, end_us = START_US + 100 * DAY_US, START_US + 200 * DAY_US
+    assert found(snapshot, snapshot.in_box(*box, start_us, end_us)) == brute(data, *box, start_us, end_us)
+    assert found(snapshot, snapshot.in_box(*box, start_us=start_us)) == brute(data, *box, start_us=start_us)
+
+
+def test_inverted_or_empty_boxes_match_nothing(snapshot):
+    assert len(snapshot.in_box(10, 0, -10, 10)) == 0
+    assert len(snapshot.in_box(0, 10, 10, -10)) == 0
+    assert len(PositionSnapshot([], [], [], []).in_box(-90, 90, -180, 180)) == 0
+
+
+def test_invalid_positions_are_dropped(snapshot, data):
+    assert len(snapshot) == len(data[1]) - 2
+
+
+def test_rows_format_dates_as_utc_iso(snapshot):
+    idx = snapshot.in_box(10, 10, 20, 21)
+    rows = snapshot.rows(idx)
+    assert [(r["lat"], r["lon"]) for r in rows] == [(10.0, 20.0), (10.0, 21.0)]
+    assert all(r["date"].endswith("+00:00") for r in rows)
+    assert iso_dates([START_US]).tolist() == ["2023-01-01T00:00:00+00:00"]
+
+
+def test_arrays_round_trip(snapshot, tmp_path):
+    arrays = snapshot.arrays()
+    for name, values in arrays.items():
+        np.save(tmp_path / f"{name}.npy", values, allow_pickle=False)
+    mapped = PositionSnapshot.from_arrays(
+        {name: np.load(tmp_path / f"{name}.npy", mmap_mode="r") for name in arrays}
+    )
+    assert len(mapped) == len(snapshot)
+    for name in PositionSnapshot.ARRAYS:
+        np.testing.assert_array_equal(getattr(mapped, name), getattr(snapshot, name))
+    for box in BOXES:
+        np.testing.assert_array_equal(mapped.in_box(*box), snapshot.in_box(*box))
+    assert mapped.rows(mapped.in_box(*BOXES[1])) == snapshot.rows(snapshot.in_box(*BOXES[1]))
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def blocking(release: threading.Event, calls: list, result=None, error=None):
+    """Work that waits for `release`, so requests can pile up behind it."""
+    def fn(*args):
+        calls.append(args)
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+
+async def wait_until(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+
+def test_concurrent_calls_for_a_key_share_one_execution():
+    async def main():
+        flight, release, calls = SingleFlight(), threading.Event(), []
+        fn = blocking(release, calls, result={"rows": [1, 2]})
+        tasks = [asyncio.ensure_future(flight.do("box", fn, "arg")) for _ in range(50)]
+        await wait_until(lambda: flight.coalesced == 49)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(main())
+    assert calls == [("arg",)]
+    assert all(r is results[0] for r in results) and results[0] == {"rows": [1, 2]}
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 49}
+
+
+def test_different_keys_run_separately():
+    async def main():
+        flight, calls = SingleFlight(), []
+        release = threading.Event()
+        release.set()
+        results = await asyncio.gather(*(flight.do(key, blocking(release, calls, result=key)) for key in "abc"))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == ["a", "b", "c"]
+    assert flight.executions == 3 and flight.coalesced == 0
+
+
+def test_nothing_is_cached_after_the_execution_finishes():
+    async def main():
+        flight, calls = SingleFlight(), []
+        release = threading.Event()
+        release.set()
+        fn = blocking(release, calls, result=1)
+        await flight.do("key", fn)
+        await flight.do("key", fn)
+        return flight, calls
+
+    flight, calls = asyncio.run(main())
+    assert len(calls) == 2 and flight.executions == 2
+
+
+def test_errors_reach_every_waiter_and_the_key_is_released():
+    async def main():
+        flight, release, calls = SingleFlight(), threading.Event(), []
+        fn = blocking(release, calls, error=ValueError("bad box"))
+        tasks = [asyncio.ensure_future(flight.do("key", fn)) for _ in range(5)]
+        await wait_until(lambda: flight.coalesced == 4)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        retry = await flight.do("key", blocking(release, calls, result="ok"))
+        return flight, results, retry
+
+    flight, results, retry = asyncio.run(main())
+    assert all(isinstance(r, ValueError) and str(r) == "bad box" for r in results)
+    assert retry == "ok"
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_a_cancelled_waiter_does_not_cancel_the_others():
+    async def main():
+        flight, release, calls = SingleFlight(), threading.Event(), []
+        fn = blocking(release, calls, result="done")
+        first = asyncio.ensure_future(flight.do("key", fn))
+        second = asyncio.ensure_future(flight.do("key", fn))
+        await wait_until(lambda: flight.coalesced == 1)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, calls
+
+    result, calls = asyncio.run(main())
+    assert result == "done"
+    assert len(calls) == 1
+
+
+def test_the_work_finishes_when_every_waiter_is_cancelled():
+    async def main():
+        flight, release, calls = SingleFlight(), threading.Event(), []
+        only = asyncio.ensure_future(flight.do("key", blocking(release, calls, error=RuntimeError("late"))))
+        await wait_until(lambda: calls)
+        only.cancel()
+        release.set()
+        await wait_until(lambda: flight.stats()["in_flight"] == 0)
+        return calls
+
+    assert len(asyncio.run(main())) == 1
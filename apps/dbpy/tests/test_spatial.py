@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from utils.spatial import EARTH_RADIUS_KM, SphereGridIndex
+
+
+def haversine_km(lat, lon, lat0, lon0):
+    lat, lon, lat0, lon0 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat, lon, lat0, lon0))
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(7)
+    n = 5000
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lon = rng.uniform(-180, 180, n)
+    # Crowd the poles and both sides of the antimeridian
+    lat[:300] = rng.uniform(88, 90, 300)
+    lat[300:600] = rng.uniform(-90, -88, 300)
+    lon[600:900] = (rng.uniform(179.5, 180.5, 300) + 180) % 360 - 180
+    lat[900:905], lon[900:905] = [90, -90, 0, 0, 45], [0, 0, 180, -180, 180]
+    platform_id = rng.integers(0, 400, n)
+    return lat, lon, platform_id
+
+
+@pytest.fixture(scope="module")
+def index(points):
+    lat, lon, platform_id = points
+    return SphereGridIndex(lat, lon, {"platform_id": platform_id})
+
+
+QUERIES = [(90, 0), (-90, 0), (89.9, 123), (-89.5, -45), (0, 180), (0, -180), (10, 179.9), (-10, -179.9),
+           (45, 0), (0, 0), (-33.3, 151.2)]
+
+
+@pytest.mark.parametrize("lat0, lon0", QUERIES)
+@pytest.mark.parametrize("radius_km", [5, 150, 1500])
+def test_within_matches_brute_force(index, points, lat0, lon0, radius_km):
+    lat, lon, _ = points
+    idx, dist = index.within(lat0, lon0, radius_km)
+    brute = haversine_km(lat, lon, lat0, lon0)
+    expected = np.flatnonzero(brute <= radius_km)
+    # Points within rounding of the edge may fall either way
+    edge = np.abs(brute - radius_km) < 1e-6
+    assert set(idx.tolist()) ^ set(expected.tolist()) <= set(np.flatnonzero(edge).tolist())
+    np.testing.assert_allclose(dist, brute[idx], atol=1e-6)
+    assert np.all(np.diff(dist) >= 0)
+
+
+@pytest.mark.parametrize("lat0, lon0", QUERIES)
+@pytest.mark.parametrize("k", [1, 10, 200])
+def test_nearest_matches_brute_force(index, points, lat0, lon0, k):
+    lat, lon, _ = points
+    idx, dist = index.nearest(lat0, lon0, k)
+    brute = np.sort(haversine_km(lat, lon, lat0, lon0))[:k]
+    assert len(idx) == k
+    np.testing.assert_allclose(dist, brute, atol=1e-6)
+
+
+@pytest.mark.parametrize("lat0, lon0", QUERIES)
+def test_nearest_unique_by_keeps_one_point_per_value(index, points, lat0, lon0):
+    lat, lon, platform_id = points
+    idx, dist = index.nearest(lat0, lon0, 25, unique_by="platform_id")
+    brute = haversine_km(lat, lon, lat0, lon0)
+    best = {}
+    for p, d in zip(platform_id.tolist(), brute.tolist()):
+        best[p] = min(d, best.get(p, np.inf))
+    expected = sorted(best.values())[:25]
+    assert len(set(platform_id[idx].tolist())) == len(idx) == 25
+    np.testing.assert_allclose(dist, expected, atol=1e-6)
+
+
+def test_nearest_returns_everything_when_k_exceeds_size():
+    index = SphereGridIndex([0, 10, 20], [0, 10, 20])
+    idx, dist = index.nearest(0, 0, 10)
+    assert sorted(idx.tolist()) == [0, 1, 2]
+    assert dist[0] == pytest.approx(0)
+
+
+def test_within_limit_keeps_the_nearest(index):
+    _, full = index.within(90, 0, 1500)
+    _, dist = index.within(90, 0, 1500, limit=5)
+    np.testing.assert_array_equal(dist, full[:5])
+
+
+def test_invalid_positions_are_skipped():
+    index = SphereGridIndex([0, np.nan, 1], [0, 5, np.inf], {"platform_id": np.array([1, 2, 3])})
+    assert len(index) == 1
+    idx, dist = index.nearest(0, 0, 3)
+    assert index.rows(idx, dist, ["platform_id", "lat", "lon"]) == [
+        {"platform_id": 1, "lat": 0.0, "lon": 0.0, "distance_km": 0.0}
+    ]
+
+
+def test_empty_index():
+    index = SphereGridIndex([], [])
+    idx, dist = index.nearest(0, 0, 5)
+    assert len(idx) == 0 and len(dist) == 0
+    idx, dist = index.within(0, 0, 100)
+    assert len(idx) == 0
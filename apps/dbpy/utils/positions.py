@@ -0,0 +1,95 @@
+"""In-memory snapshot of float positions for viewport (bounding box) queries.
+
+Positions are bucketed into a uniform lat/lon grid and stored sorted by bucket,
+row by row, so the buckets of one grid row that a box overlaps form a single
+contiguous slice. A box query gathers one slice per overlapped grid row and
+masks just those points exactly.
+"""
+from typing import Optional
+
+import numpy as np
+
+BUCKET_DEG = 1.0
+
+
+def iso_dates(epoch_us) -> np.ndarray:
+    """UTC ISO-8601 strings ("2023-03-01T00:00:00+00:00") for epoch microseconds."""
+    seconds = np.asarray(epoch_us, dtype=np.int64) // 1_000_000
+    return np.char.add(np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s"), "+00:00")
+
+
+class PositionSnapshot:
+    """Read-only position arrays (platform_id, lat, lon, date as epoch µs) sorted by grid bucket."""
+
+    def __init__(self, platform_id, lat, lon, date_us, bucket_deg: float = BUCKET_DEG):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        self.bucket_deg = bucket_deg
+        self.n_rows = int(round(180 / bucket_deg))
+        self.n_cols = int(round(360 / bucket_deg))
+
+        keys = self._bucket_rows(lat[valid]) * self.n_cols + self._bucket_cols(lon[valid])
+        order = np.argsort(keys, kind="stable")
+        self.lat = lat[valid][order]
+        self.lon = lon[valid][order]
+        self.platform_id = np.asarray(platform_id)[valid][order]
+        self.date_us = np.asarray(date_us, dtype=np.int64)[valid][order]
+        # offsets[k] = first point of bucket k; bucket k spans offsets[k]:offsets[k + 1]
+        self.offsets = np.searchsorted(keys[order], np.arange(self.n_rows * self.n_cols + 1))
+        self.size = len(self.lat)
+
+    ARRAYS = ("platform_id", "lat", "lon", "date_us", "offsets")
+
+    def arrays(self) -> dict:
+        """The sorted arrays and bucket offsets, e.g. for export."""
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, bucket_deg: float = BUCKET_DEG) -> "PositionSnapshot":
+        """Wrap arrays produced by `arrays()` (possibly memory-mapped) without copying or re-sorting."""
+        snapshot = cls.__new__(cls)
+        snapshot.bucket_deg = bucket_deg
+        snapshot.n_rows = int(round(180 / bucket_deg))
+        snapshot.n_cols = int(round(360 / bucket_deg))
+        for name in cls.ARRAYS:
+            setattr(snapshot, name, arrays[name])
+        snapshot.size = len(snapshot.lat)
+        return snapshot
+
+    def __len__(self):
+        return self.size
+
+    def _bucket_rows(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.bucket_deg), 0, self.n_rows - 1).astype(np.int64)
+
+    def _bucket_cols(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180) / self.bucket_deg), 0, self.n_cols - 1).astype(np.int64)
+
+    def in_box(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+               start_us: Optional[int] = None, end_us: Optional[int] = None) -> np.ndarray:
+        """Indices of points with min <= lat/lon <= max (and start <= date <= end), in bucket order."""
+        if min_lat > max_lat or min_lon > max_lon or not self.size:
+            return np.empty(0, dtype=np.int64)
+        r0, r1 = self._bucket_rows([min_lat, max_lat])
+        c0, c1 = self._bucket_cols([min_lon, max_lon])
+        row_keys = np.arange(r0, r1 + 1) * self.n_cols
+        starts = self.offsets[row_keys + c0]
+        ends = self.offsets[row_keys + c1 + 1]
+        idx = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+        lat, lon = self.lat[idx], self.lon[idx]
+        keep = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        if start_us is not None:
+            keep &= self.date_us[idx] >= start_us
+        if end_us is not None:
+            keep &= self.date_us[idx] <= end_us
+        return idx[keep]
+
+    def rows(self, idx) -> list:
+        """Points as {platform_id, lat, lon, date} dicts."""
+        return [
+            {"platform_id": p, "lat": la, "lon": lo, "date": d}
+            for p, la, lo, d in zip(self.platform_id[idx].tolist(), self.lat[idx].tolist(),
+                                    self.lon[idx].tolist(), iso_dates(self.date_us[idx]).tolist())
+        ]
@@ -0,0 +1,42 @@
+"""Coalescing of identical concurrent requests ("single flight").
+
+The first request for a key starts the work in a thread; requests for the same
+key that arrive while it runs wait on that execution instead of starting their
+own, and all of them receive its result (or its exception). The work runs as its
+own task, so a waiter that is cancelled (e.g. the client disconnected) neither
+cancels it nor affects the others. Nothing is cached: once the execution
+finishes, the next request for the key starts a new one.
+"""
+import asyncio
+from typing import Callable, Dict, Hashable
+
+from fastapi.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable, *args):
+        """Result of `fn(*args)`, shared with every concurrent call for `key`."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self._inflight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "executions": self.executions, "coalesced": self.coalesced}
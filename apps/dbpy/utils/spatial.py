@@ -0,0 +1,137 @@
+"""In-memory spatial index for float positions.
+
+Positions are mapped to unit vectors on the sphere and bucketed into a uniform
+3-D grid over the cube [-1, 1]^3. Great-circle distance grows monotonically with
+the straight-line (chord) distance between unit vectors, so nearest-neighbour and
+radius searches become plain Euclidean searches on the grid, with no special
+cases at the poles or across the ±180° meridian.
+"""
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+POINTS_PER_CELL = 16
+MAX_CELLS_PER_AXIS = 256
+
+
+def to_unit_vectors(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class SphereGridIndex:
+    """Grid index over lat/lon points with k-nearest and great-circle radius queries.
+
+    `columns` are per-point arrays (e.g. platform_id, date) returned alongside
+    matches; `lat` and `lon` are always included.
+    """
+
+    def __init__(self, lat, lon, columns: Optional[Dict[str, np.ndarray]] = None):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        self.columns = {"lat": lat[valid], "lon": lon[valid]}
+        for name, values in (columns or {}).items():
+            self.columns[name] = np.asarray(values)[valid]
+        self.points = to_unit_vectors(self.columns["lat"], self.columns["lon"])
+        self.size = len(self.points)
+
+        # Points lie on the sphere's surface, which crosses roughly 4.7 * m^2 of the m^3 cells
+        m = int(math.sqrt(max(self.size, 1) / (POINTS_PER_CELL * 4.7)))
+        self.cells_per_axis = min(max(m, 1), MAX_CELLS_PER_AXIS)
+        self.cell_size = 2.0 / self.cells_per_axis
+
+        keys = self._cell_keys(self._cell_coords(self.points))
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.cell_keys, self.cell_starts = np.unique(sorted_keys, return_index=True)
+        self.cell_ends = np.append(self.cell_starts[1:], len(sorted_keys))
+
+    def __len__(self):
+        return self.size
+
+    # ---------- Grid helpers ----------
+    def _cell_coords(self, xyz):
+        coords = np.floor((np.asarray(xyz) + 1.0) / self.cell_size).astype(np.int64)
+        return np.clip(coords, 0, self.cells_per_axis - 1)
+
+    def _cell_keys(self, coords):
+        m = self.cells_per_axis
+        return (coords[..., 0] * m + coords[..., 1]) * m + coords[..., 2]
+
+    def _candidates(self, q, chord: float) -> np.ndarray:
+        """Indices of points in every cell overlapping the cube of half-width `chord` around `q`."""
+        lo = self._cell_coords(q - chord)
+        hi = self._cell_coords(q + chord)
+        box = int(np.prod(hi - lo + 1))
+        if box >= len(self.cell_keys):
+            # The box touches more cells than are occupied; scanning everything is cheaper
+            return np.arange(self.size)
+        axes = [np.arange(lo[i], hi[i] + 1) for i in range(3)]
+        grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        keys = self._cell_keys(grid)
+        pos = np.searchsorted(self.cell_keys, keys)
+        found = pos < len(self.cell_keys)
+        pos, keys = pos[found], keys[found]
+        pos = pos[self.cell_keys[pos] == keys]  # empty cells land on the next occupied one
+        if len(pos) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[s:e] for s, e in zip(self.cell_starts[pos], self.cell_ends[pos])])
+
+    def _within(self, q, chord: float):
+        idx = self._candidates(q, chord)
+        dist = np.linalg.norm(self.points[idx] - q, axis=1)
+        keep = dist <= chord
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    # ---------- Queries ----------
+    def within(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None):
+        """`(indices, distances_km)` of points within `radius_km` great-circle distance, nearest first."""
+        q = to_unit_vectors(lat, lon)
+        idx, chord = self._within(q, km_to_chord(radius_km))
+        if limit is not None:
+            idx, chord = idx[:limit], chord[:limit]
+        return idx, chord_to_km(chord)
+
+    def nearest(self, lat: float, lon: float, k: int, unique_by: Optional[str] = None):
+        """`(indices, distances_km)` of the `k` nearest points.
+
+        With `unique_by`, only the nearest point per distinct value of that column
+        counts (e.g. one position per float).
+        """
+        q = to_unit_vectors(lat, lon)
+        chord = self.cell_size
+        while True:
+            idx, dist = self._within(q, chord)
+            if unique_by is not None and len(idx):
+                _, first = np.unique(self.columns[unique_by][idx], return_index=True)
+                first.sort()
+                idx, dist = idx[first], dist[first]
+            # Everything within `chord` has been seen, so the first k are final
+            if len(idx) >= k or chord >= 2.0:
+                return idx[:k], chord_to_km(dist[:k])
+            chord = min(chord * 2, 2.0)
+
+    def rows(self, idx, distances_km, fields) -> list:
+        """Matches as dicts of `fields` plus `distance_km`."""
+        out = []
+        for i, d in zip(idx, distances_km):
+            row = {f: self.columns[f][i].item() if hasattr(self.columns[f][i], "item") else self.columns[f][i]
+                   for f in fields}
+            row["distance_km"] = round(float(d), 3)
+            out.append(row)
+        return out
@@ -1,58 +1,201 @@
 import duckdb
-from config import GROQ_API_KEY
-from typing import TypedDict, Annotated, Sequence
+from config import GROQ_API_KEY, LLM_BACKEND
+from typing import TypedDict, Annotated, Sequence, Optional, List
 import operator
-from langchain_groq import ChatGroq
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
 from langchain_core.tools import tool
-from langgraph.prebuilt import ToolNode
-from langgraph.graph import StateGraph, END
 
-# New imports for memory
-from langchain.memory import ConversationSummaryBufferMemory
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fast_path
+from approx import rewrite_to_sample
+from query_cache import QueryCache, dataset_version
+from regions import rewrite_region_filters
+from session_memory import SessionMemory
+from tracing import span, wrap_context
 
 __DB_PATH = "./LOCAL/Resources/argo.db"
+QUERY_CACHE_PATH = "./LOCAL/Resources/query_cache.sqlite"
 
 # ===============================
 # 1. SETUP: Model and Tools
 # ===============================
+# Model clients, the compiled graph, the DB handle and the result cache are all
+# built on first use, so importing this module stays cheap and works without keys.
+
+MODEL_NAME = "scripted-stub" if LLM_BACKEND == "stub" else "openai/gpt-oss-120b"
+_chat_model = None
+_model_with_tools = None
+_app = None
+_init_lock = threading.RLock()
+
+
+def get_chat_model():
+    """The chat model client, created on first use."""
+    global _chat_model
+    with _init_lock:
+        if _chat_model is None:
+            if LLM_BACKEND == "stub":
+                # Offline, deterministic stand-in for benchmarks (see bench.py)
+                from stub_model import ScriptedChatModel
+                _chat_model = ScriptedChatModel()
+            else:
+                from langchain_groq import ChatGroq
+                _chat_model = ChatGroq(temperature=0.7, model_name=MODEL_NAME, api_key=GROQ_API_KEY)
+        return _chat_model
 
-MODEL_NAME = "openai/gpt-oss-120b"
-chat_model = ChatGroq(temperature=0.7, model_name=MODEL_NAME, api_key=GROQ_API_KEY)
 
 # --- Database Tool ---
-@tool("database_query_tool")
-def database_query_tool(query: str) -> dict:
-    """Executes a SQL query against the DuckDB Argo float database.
-    The SQL string must be passed in the 'query' field (not 'question')."""
-    try:
-        con = duckdb.connect(__DB_PATH, read_only=True)
-        cursor = con.cursor()
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
-        cursor.close()
-        con.close()
+# Repeat questions produce near-identical SQL; serve those from a normalized result cache
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache(__DB_PATH, QUERY_CACHE_PATH)
+        return _query_cache
+
+
+# Each tool call opens its own read-only handle and closes it when done, so no
+# handle outlives the call: ingest can take the write lock between turns, and a
+# replaced argo.db is read from the next call on. The queries of one batch run
+# concurrently on cursors of the batch's handle.
+QUERY_WORKERS = 4
+_query_pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+
+
+def open_db():
+    return duckdb.connect(__DB_PATH, read_only=True)
+
+
+def run_query(query: str, approximate: bool = False, db=None, version: str = None) -> dict:
+    """Execute one SQL query through the result cache; errors are returned, not raised.
+
+    With `db`, the query runs on a cursor of that handle instead of a handle of its
+    own; `version` is then the dataset version taken before `db` was opened.
+    """
+    variant = "approx" if approximate else ""
+    with span("sql", query=query, approximate=approximate) as s:
+        query_cache = get_query_cache()
+        cached = query_cache.get(query, variant)
+        if cached is not None:
+            s.set(cached=True, rows=len(cached.get("data", [])))
+            return cached
+
+        try:
+            started = time.perf_counter()
+            # Taken before the database is opened: if argo.db is replaced meanwhile,
+            # the result is not cached under the new version
+            if db is None:
+                version = dataset_version(__DB_PATH)
+            conn = open_db() if db is None else db
+            cursor = conn.cursor()
+            try:
+                # Region names are resolved once against the region dimension and
+                # filtered as integer region ids
+                region_rewrite = rewrite_region_filters(cursor, query)
+                sql = region_rewrite[0] if region_rewrite else query
+                # Large aggregates can be answered from the stratified sample tables
+                rewrite = rewrite_to_sample(cursor, sql) if approximate else None
+                cursor.execute(rewrite[0] if rewrite else sql)
+                rows = cursor.fetchall()
+                column_names = [desc[0] for desc in cursor.description]
+            finally:
+                cursor.close()
+                if db is None:
+                    conn.close()
+
+            # Cast everything to str for JSON safety
+            safe_rows = [[str(item) for item in row] for row in rows]
+            result = {"columns": column_names, "data": safe_rows}
+            if region_rewrite:
+                result.update(region_rewrite[1])
+            if rewrite:
+                result.update(rewrite[1])
+            query_cache.put(query, result, time.perf_counter() - started, variant, version)
+            s.set(cached=False, rows=len(rows), sampled=bool(rewrite), region_filters=len(region_rewrite[1]["region_filters"]) if region_rewrite else 0)
+            return result
+
+        except Exception as e:
+            s.set(error=str(e))
+            return {"error": str(e)}
 
-        # Cast everything to str for JSON safety
-        safe_rows = [[str(item) for item in row] for row in rows]
-        return {"columns": column_names, "data": safe_rows}
 
-    except Exception as e:
-        return {"error": str(e)}
+@tool("database_query_tool")
+def database_query_tool(query: str, approximate: bool = False) -> dict:
+    """Executes a SQL query against the DuckDB Argo float database.
+    The SQL string must be passed in the 'query' field (not 'question').
+    Set 'approximate' to true for broad AVG/SUM/COUNT aggregates where a fast
+    estimate with 95% confidence intervals is good enough."""
+    with span("call_tool", tool="database_query_tool"):
+        return run_query(query, approximate)
+
+
+@tool("database_batch_query_tool")
+def database_batch_query_tool(queries: List[str], years: Optional[List[int]] = None,
+                              approximate: bool = False) -> dict:
+    """Executes several SQL queries against the Argo database in parallel.
+    Use it for multi-year or multi-region comparisons instead of several
+    database_query_tool calls. If 'years' is given, every query may use the
+    placeholder {year} in table names (e.g. argo{year}); it is run once per year
+    and the rows come back as one table with a leading 'year' column."""
+    jobs = []  # (index of the original query, year, sql)
+    for i, query in enumerate(queries):
+        if years and "{year}" in query:
+            jobs.extend((i, y, query.replace("{year}", str(y))) for y in years)
+        else:
+            jobs.append((i, None, query))
+
+    with span("call_tool", tool="database_batch_query_tool", queries=len(jobs)):
+        version = dataset_version(__DB_PATH)
+        try:
+            db = open_db()
+        except duckdb.Error as e:
+            return {"error": str(e)}
+        try:
+            results = list(_query_pool.map(
+                wrap_context(lambda job: run_query(job[2], approximate, db, version)), jobs
+            ))
+        finally:
+            db.close()
+
+    out = []
+    for i, query in enumerate(queries):
+        pieces = [(y, r) for (j, y, _), r in zip(jobs, results) if j == i]
+        if len(pieces) == 1 and pieces[0][0] is None:
+            out.append(dict(query=query, **pieces[0][1]))
+            continue
+        columns = pieces[0][1].get("columns")
+        if columns is not None and all(r.get("columns") == columns for _, r in pieces):
+            # Per-year pieces of the same query come back as one table
+            out.append({
+                "query": query,
+                "columns": ["year"] + columns,
+                "data": [[str(y)] + row for y, r in pieces for row in r["data"]],
+            })
+        else:
+            out.append({"query": query, "by_year": {str(y): r for y, r in pieces}})
+    return {"results": out}
 
 # --- General Knowledge Tool ---
 @tool("general_knowledge_tool")
 def general_knowledge_tool(question: str) -> str:
     """Answers general knowledge questions about oceanography or other topics."""
-    try:
-        response = chat_model.invoke([HumanMessage(content=question)])
-        return response.content
-    except Exception as e:
-        return f"Error: {e}"
+    with span("call_tool", tool="general_knowledge_tool"):
+        try:
+            response = get_chat_model().invoke([HumanMessage(content=question)])
+            return response.content
+        except Exception as e:
+            return f"Error: {e}"
 
 # List of tools
-tools = [database_query_tool, general_knowledge_tool]
+tools = [database_query_tool, database_batch_query_tool, general_knowledge_tool]
 
 db_schema = """
 - platform_id (INT)
@@ -68,32 +211,59 @@ db_schema = """
 - pres_qc (TINYINT)
 """
 
-system_prompt = f"""
+# Added by `ingest.py --steps clean`
+clean_schema = """- temp_c_good (DOUBLE)
+- sal_psu_good (DOUBLE)
+- depth_m_good (DOUBLE)
+"""
+
+raw_aggregate_rules = """- For aggregates (AVG, SUM, MIN, MAX):
+  - Always include `IS NOT NULL` and 'NOT ISNAN()' on the aggregated column.
+  - Additionally, only include rows where the QC flag for the aggregated column is less than 3:
+    • temp_c → temp_qc < 3
+    • depth_m → pres_qc < 3
+    • sal_psu → psal_qc < 3"""
+
+clean_aggregate_rules = """- For aggregates (AVG, SUM, MIN, MAX), use `temp_c_good`, `sal_psu_good` and `depth_m_good` instead of
+  the raw columns. NaN, missing and failed-QC values are already NULL there, so add no IS NOT NULL,
+  ISNAN or QC flag filters, e.g. SELECT AVG(temp_c_good) FROM argo2023 WHERE region_name ILIKE 'Arabian Sea'."""
+
+
+@functools.lru_cache(maxsize=2)
+def build_system_prompt(clean_columns: bool = False) -> str:
+    """The agent's system prompt; with `clean_columns`, aggregates go through the `*_good` columns."""
+    schema = db_schema + clean_schema if clean_columns else db_schema
+    aggregate_rules = clean_aggregate_rules if clean_columns else raw_aggregate_rules
+    return f"""
 You are a world-class oceanographic data analyst and an expert in DuckDB SQL.
 
 **Schema**
 - Only use the tables `argo2022`, `argo2023` and `argo2024` with these columns:
-{db_schema}
+{schema}
 
 **Query Rules**
 - Each table consists data for that year only. Use the tables accordingly. Example: If user asks for data info between 2022 and 2024, then use all the three tables and look for the specific dates in the respective tables.
-- For aggregates (AVG, SUM, MIN, MAX):
-  - Always include `IS NOT NULL` and 'NOT ISNAN()' on the aggregated column.
-  - Additionally, only include rows where the QC flag for the aggregated column is less than 3:
-    • temp_c → temp_qc < 3
-    • depth_m → pres_qc < 3
-    • sal_psu → psal_qc < 3
+- For questions spanning several years or comparing regions, make ONE `database_batch_query_tool` call instead of
+  several `database_query_tool` calls. Write the per-year query once against `argo{{year}}` and pass `years`,
+  e.g. queries=["SELECT AVG(temp_c) ... FROM argo{{year}} WHERE ..."], years=[2022, 2023, 2024].
+{aggregate_rules}
   - You may add additional conditions (e.g., region_name, lat/lon ranges, date/month).
     Example filters:
       • region_name ILIKE 'Arabian Sea'
       • lat BETWEEN -20 AND -10
       • lon BETWEEN 0 AND 10
       • EXTRACT(MONTH FROM date) = 8
+- Filter regions by name, e.g. `region_name ILIKE 'Arabian Sea'`, without wildcards. Names are resolved against
+  the region list (aliases and small misspellings are accepted) and run as fast integer region filters;
+  `region_filters` in the result shows which region each name matched.
 - Never query `information_schema` or run exploratory DISTINCT queries.
+- For broad AVG/SUM/COUNT questions over a whole year or large region, call `database_query_tool` with
+  `approximate: true`. The answer then comes from a stratified sample and each estimate has a matching
+  `<column>_ci95` column; report it as "value ± ci95". Use exact mode for MIN/MAX, single floats and small areas.
 - If the query result is empty or NULL, return: “No valid data available.”
 
 **Phase 1: Tool Selection**
-- Use `database_query_tool` for numeric data.
+- Use `database_query_tool` for numeric data, `database_batch_query_tool` for several queries at once.
 - Use `general_knowledge_tool` for definitions.
 
 **Phase 2: Answer Synthesis**
@@ -101,57 +271,77 @@ You are a world-class oceanographic data analyst and an expert in DuckDB SQL.
 - If the query result is empty or NaN, say so directly.
 """
 
+
+def get_system_prompt() -> str:
+    """The prompt for the current database: clean-column rules once every year's table has them."""
+    try:
+        return build_system_prompt(fast_path.has_clean_columns())
+    except duckdb.Error as e:
+        print(f"[app] could not inspect argo tables, using raw-column rules: {e}")
+        return build_system_prompt()
+
 # ===============================
-# 2. MEMORY SETUP
+# 2. MODEL WITH TOOLS
 # ===============================
-# This maintains a rolling summary of the conversation
-summary_memory = ConversationSummaryBufferMemory(
-    llm=chat_model,
-    max_token_limit=500,       # keep summaries short
-    return_messages=True
-)
-
-# Bind tools to the model
-model_with_tools = chat_model.bind_tools(tools)
+# Conversation memory is per session (see session_memory.py) and is passed in
+# through the graph state, so there is no module-level memory to swap.
+# The model is bound to the tools when the graph is built (see get_app).
 
 # ===============================
 # 3. DEFINE AGENT STATE
 # ===============================
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], operator.add]
+    memory: Optional[SessionMemory]
 
 # ===============================
 # 4. DEFINE NODES & GRAPH
 # ===============================
 def call_model_node(state):
     """Call LLM to decide next actions or generate response."""
-    # Inject system prompt + summarized memory + latest turn
-    memory_vars = summary_memory.load_memory_variables({})
-    summarized_history = memory_vars.get("history", [])
-    messages = [SystemMessage(content=system_prompt)] + summarized_history + state["messages"]
-
-    response = model_with_tools.invoke(messages)
+    # Inject system prompt + session summary/tail + current turn
+    memory = state.get("memory")
+    history = memory.as_messages() if memory else []
+    messages = [SystemMessage(content=get_system_prompt())] + history + state["messages"]
+
+    with span("call_model", model=MODEL_NAME, prompt_messages=len(messages)) as s:
+        response = _model_with_tools.invoke(messages)
+        usage = getattr(response, "usage_metadata", None) or {}
+        s.set(
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+            tool_calls=len(getattr(response, "tool_calls", None) or []),
+        )
     # print("\n--- Model raw response ---")
     # print(response)
     # print("---\n")
     return {"messages": [response]}
 
-tool_node = ToolNode(tools)
-
 def should_continue(state):
     """Decide whether to continue tool calls or finish."""
     last_message = state["messages"][-1]
     return "continue" if getattr(last_message, "tool_calls", None) else "end"
 
-workflow = StateGraph(AgentState)
-workflow.add_node("call_model", call_model_node)
-workflow.add_node("call_tool", tool_node)
-workflow.set_entry_point("call_model")
-workflow.add_conditional_edges(
-    "call_model", should_continue, {"continue": "call_tool", "end": END}
-)
-workflow.add_edge("call_tool", "call_model")
-app = workflow.compile()
+
+def get_app():
+    """The compiled agent graph, built on first use."""
+    global _app, _model_with_tools
+    with _init_lock:
+        if _app is None:
+            from langgraph.graph import StateGraph, END
+            from langgraph.prebuilt import ToolNode
+
+            _model_with_tools = get_chat_model().bind_tools(tools)
+            workflow = StateGraph(AgentState)
+            workflow.add_node("call_model", call_model_node)
+            workflow.add_node("call_tool", ToolNode(tools))
+            workflow.set_entry_point("call_model")
+            workflow.add_conditional_edges(
+                "call_model", should_continue, {"continue": "call_tool", "end": END}
+            )
+            workflow.add_edge("call_tool", "call_model")
+            _app = workflow.compile()
+        return _app
 
 # ===============================
 # 5. CHAT LOOP
@@ -160,23 +350,29 @@ def run_chat():
     print("--- 🚀 Argo AI Agent ---")
     print("Ask questions about Argo data. Type 'exit' to quit.")
 
-    # We'll store only the *latest turn* in state, summaries come from memory
-    conversation_state = {"messages": []}
+    # We'll store only the *latest turn* in state, earlier turns come from memory
+    memory = SessionMemory("cli")
+    conversation_state = {"messages": [], "memory": memory}
 
     while True:
         user_question = input("\n> ")
         if user_question.lower() == "exit":
             break
 
-        # Save user input to memory
-        summary_memory.chat_memory.add_user_message(user_question)
+        direct_answer = fast_path.try_answer(user_question)
+        if direct_answer is not None:
+            memory.add_message("user", user_question)
+            memory.add_message("assistant", direct_answer)
+            print("\n--- ✅ Final Answer (fast path) ---")
+            print(direct_answer)
+            continue
 
         conversation_state["messages"] = [HumanMessage(content=user_question)]
 
         print("\n--- Agent Thinking... ---")
         final_answer = None
 
-        for event in app.stream(conversation_state, {"recursion_limit": 15}):
+        for event in get_app().stream(conversation_state, {"recursion_limit": 15}):
             for key, value in event.items():
                 print(f"Node '{key}':\n{value}\n---")
 
@@ -184,12 +380,14 @@ def run_chat():
                 last_message = event["call_model"]["messages"][-1]
                 if not getattr(last_message, "tool_calls", None):
                     final_answer = last_message
-                    # Save AI response to memory
-                    summary_memory.chat_memory.add_ai_message(final_answer.content)
 
         print("\n--- ✅ Final Answer ---")
         if final_answer:
             print(final_answer.content)
+            # Save the turn to memory
+            memory.add_message("user", user_question)
+            memory.add_message("assistant", final_answer.content)
+            memory.prune(get_chat_model())
         else:
             print("The agent could not generate a final answer.")
 
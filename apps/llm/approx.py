@@ -0,0 +1,140 @@
+"""Approximate-answer mode for the agent's SQL tool.
+
+Large aggregate queries over a yearly `argo{year}` table are rewritten onto the
+stratified `argo{year}_sample` table built by `ingest.py`. AVG, SUM and COUNT
+become weighted estimators over the sample's `_w` column and every estimate gets
+a companion `<alias>_ci95` column holding the half-width of its 95% confidence
+interval (normal approximation with Kish's effective sample size).
+"""
+import copy
+import json
+import re
+
+# Tables smaller than this are cheap enough to scan exactly
+APPROX_MIN_ROWS = 2_000_000
+Z_95 = 1.96
+
+_ARGO_TABLE = re.compile(r"^argo\d{4}$")
+_AGGREGATES = {
+    "avg", "mean", "sum", "count", "count_star", "min", "max", "median", "mode",
+    "quantile", "quantile_cont", "quantile_disc", "stddev", "stddev_pop", "stddev_samp",
+    "var_pop", "var_samp", "variance", "first", "last", "any_value", "arg_max", "arg_min",
+    "argmax", "argmin", "list", "string_agg", "histogram", "approx_count_distinct",
+}
+
+# Estimate and 95% half-width per aggregate; `__x` stands for the aggregated argument
+_X_WEIGHT = "SUM(_w) FILTER (WHERE __x IS NOT NULL)"
+_TEMPLATES = {
+    "avg": (
+        f"SUM(_w * __x) / {_X_WEIGHT}",
+        f"{Z_95} * SQRT(GREATEST(SUM(_w * __x * __x) / {_X_WEIGHT} - POW(SUM(_w * __x) / {_X_WEIGHT}, 2), 0)"
+        f" * SUM(_w * _w) FILTER (WHERE __x IS NOT NULL)) / {_X_WEIGHT}",
+    ),
+    "sum": (
+        "SUM(_w * __x)",
+        f"{Z_95} * SQRT(SUM(_w * (_w - 1) * __x * __x))",
+    ),
+    "count": (
+        _X_WEIGHT,
+        f"{Z_95} * SQRT(SUM(_w * (_w - 1)) FILTER (WHERE __x IS NOT NULL))",
+    ),
+    "count_star": (
+        "SUM(_w)",
+        f"{Z_95} * SQRT(SUM(_w * (_w - 1)))",
+    ),
+}
+_TEMPLATES["mean"] = _TEMPLATES["avg"]
+
+
+def _parse(con, sql: str) -> dict:
+    return json.loads(con.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+
+
+def _template_expr(con, template: str) -> dict:
+    return _parse(con, f"SELECT {template} FROM t")["statements"][0]["node"]["select_list"][0]
+
+
+def _substitute(node, arg):
+    """Replace every `__x` column reference in a template tree with `arg`."""
+    if isinstance(node, list):
+        return [_substitute(n, arg) for n in node]
+    if not isinstance(node, dict):
+        return node
+    if node.get("class") == "COLUMN_REF" and node.get("column_names") == ["__x"]:
+        return copy.deepcopy(arg)
+    return {k: _substitute(v, arg) for k, v in node.items()}
+
+
+def _contains_aggregate(node) -> bool:
+    if isinstance(node, list):
+        return any(_contains_aggregate(n) for n in node)
+    if not isinstance(node, dict):
+        return False
+    if node.get("class") == "FUNCTION" and node.get("function_name", "").lower() in _AGGREGATES:
+        return True
+    return any(_contains_aggregate(v) for v in node.values())
+
+
+def estimated_rows(con, table: str) -> int:
+    row = con.execute(
+        "SELECT estimated_size FROM duckdb_tables() WHERE table_name = ?", [table]
+    ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def rewrite_to_sample(con, query: str, min_rows: int = APPROX_MIN_ROWS):
+    """Return `(sql, info)` for an approximate version of `query`, or None.
+
+    None means the query should run exactly: it is not a single-table aggregate
+    over a yearly table, the table is small, or no sample table exists.
+    """
+    tree = _parse(con, query)
+    if tree.get("error") or len(tree["statements"]) != 1:
+        return None
+    node = tree["statements"][0]["node"]
+    if node.get("type") != "SELECT_NODE" or node["cte_map"]["map"] or node.get("having"):
+        return None
+    source = node.get("from_table") or {}
+    table = source.get("table_name", "").lower()
+    if source.get("type") != "BASE_TABLE" or not _ARGO_TABLE.match(table):
+        return None
+    sample = f"{table}_sample"
+    if not estimated_rows(con, sample) or estimated_rows(con, table) < min_rows:
+        return None
+
+    select_list, ci_columns, rewritten = [], [], False
+    for i, expr in enumerate(node["select_list"]):
+        fn = expr.get("function_name", "").lower() if expr.get("class") == "FUNCTION" else ""
+        if fn in _TEMPLATES and not expr.get("distinct") and expr.get("filter") is None:
+            if _contains_aggregate(expr["children"]):
+                return None
+            alias = expr.get("alias") or f"{fn.replace('_star', '')}_{i}"
+            estimate_sql, ci_sql = _TEMPLATES[fn]
+            arg = expr["children"][0] if expr["children"] else None
+            estimate = _substitute(_template_expr(con, estimate_sql), arg)
+            estimate["alias"] = alias
+            ci = _substitute(_template_expr(con, ci_sql), arg)
+            ci["alias"] = f"{alias}_ci95"
+            select_list.append(estimate)
+            ci_columns.append(ci)
+            rewritten = True
+        elif _contains_aggregate(expr):
+            # MIN/MAX/percentiles etc. cannot be estimated from a sample
+            return None
+        else:
+            select_list.append(expr)
+    if not rewritten:
+        return None
+
+    # CI columns go last so positional ORDER BY / GROUP BY references stay valid
+    node["select_list"] = select_list + ci_columns
+    source["table_name"] = sample
+    sql = con.execute("SELECT json_deserialize_sql(?)", [json.dumps(tree)]).fetchone()[0]
+    info = {
+        "approximate": True,
+        "confidence": 0.95,
+        "source_table": table,
+        "sample_table": sample,
+        "note": "Columns ending in _ci95 are half-widths of 95% confidence intervals for the matching estimate.",
+    }
+    return sql, info
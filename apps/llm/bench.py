@@ -0,0 +1,269 @@
+"""Offline load benchmark for the chat API.
+
+Builds a synthetic Argo database in a scratch directory, swaps in the scripted
+stub model (LLM_BACKEND=stub) and drives server.py's `/sessions/new` and `/chat`
+endpoints in-process with many concurrent sessions. No network access or API
+keys are needed, so runs are reproducible and comparable across changes to the
+graph, memory and storage layers:
+
+    python bench.py --sessions 64 --turns 6 --concurrency 16
+    python bench.py --store duckdb:///./LOCAL/Resources/sessions.duckdb --llm-latency-ms 200 --json
+
+Reports throughput, turn latency, per-stage latency (from the tracing spans) and
+session store write contention (time spent waiting for the writer lock). With
+--cold-start it also times `import server` and the first /warmup in fresh processes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import duckdb
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+YEARS = (2022, 2023, 2024)
+REGIONS = ["Arabian Sea", "Bay of Bengal", "Indian Ocean", "North Atlantic Ocean", "South Pacific Ocean"]
+
+# Fast-path questions skip the model; the rest replay stub_model.DEFAULT_SCRIPT
+FAST_PATH_QUESTIONS = [
+    "average temperature in the Arabian Sea in 2023",
+    "maximum salinity in the Bay of Bengal in August 2022",
+    "minimum temperature in the Indian Ocean",
+]
+AGENT_QUESTIONS = [
+    "Which float recorded the warmest water near the equator last spring?",
+    "Compare temperatures across the years",
+    "How many measurements were taken in 2023?",
+    "What is the salinity like in the Bay of Bengal?",
+]
+
+
+# ---------- Synthetic data ----------
+def build_synthetic_db(path: str, floats: int = 300, profiles: int = 20, levels: int = 30):
+    """Create a small `argo.db` with the tables the agent and fast path read."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    region_list = ", ".join(f"'{r}'" for r in REGIONS)
+    with duckdb.connect(path) as con:
+        con.execute("SELECT setseed(0.42)")
+        for year in YEARS:
+            con.execute(f"""
+            CREATE OR REPLACE TABLE argo{year} AS
+            SELECT
+                (1900000 + f)::INT AS platform_id,
+                TIMESTAMPTZ '{year}-01-01' + INTERVAL (p * (360 // {profiles}) + f % 7) DAY AS date,
+                ((f * 37) % 160 - 80 + p * 0.05)::DOUBLE AS lat,
+                ((f * 71) % 360 - 180 + p * 0.05)::DOUBLE AS lon,
+                (d * 60 + 5)::DOUBLE AS depth_m,
+                CASE WHEN random() < 0.01 THEN 'NaN'::DOUBLE ELSE 28 - d * 0.8 + random() END AS temp_c,
+                CASE WHEN random() < 0.02 THEN NULL ELSE 35 + random() END AS sal_psu,
+                (CASE WHEN random() < 0.03 THEN 4 ELSE 1 END)::TINYINT AS psal_qc,
+                (CASE WHEN random() < 0.03 THEN 4 ELSE 1 END)::TINYINT AS temp_qc,
+                1::TINYINT AS pres_qc,
+                [{region_list}][f % {len(REGIONS)} + 1] AS region_name
+            FROM range({floats}) t1(f), range({profiles}) t2(p), range({levels}) t3(d)
+            """)
+            con.execute(f"""
+            CREATE OR REPLACE TABLE distinct_float_positions_{year} AS
+            SELECT DISTINCT platform_id, date, lat, lon FROM argo{year}
+            """)
+            con.execute(f"""
+            CREATE OR REPLACE TABLE latest_float_positions_{year} AS
+            SELECT platform_id, ARG_MAX(lat, date) AS lat, ARG_MAX(lon, date) AS lon, MAX(date) AS date
+            FROM distinct_float_positions_{year} GROUP BY platform_id
+            """)
+            con.execute(f"""
+            CREATE OR REPLACE TABLE argo{year}_positions_region AS
+            SELECT DISTINCT lat, lon, region_name FROM argo{year}
+            """)
+
+        import ingest
+        for year in YEARS:
+            for step in ingest.STEPS.values():
+                step(con, year)
+
+
+# ---------- Load ----------
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+
+async def run_session(client, rng, turns, fast_path_share, latencies, errors):
+    r = await client.post("/sessions/new")
+    if r.status_code != 200:
+        errors.append(f"/sessions/new {r.status_code}: {r.text[:200]}")
+        return
+    session_id = r.json()["session_id"]
+    for _ in range(turns):
+        pool = FAST_PATH_QUESTIONS if rng.random() < fast_path_share else AGENT_QUESTIONS
+        started = time.perf_counter()
+        r = await client.post("/chat", json={"session_id": session_id, "message": rng.choice(pool)})
+        if r.status_code == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(f"/chat {r.status_code}: {r.text[:200]}")
+
+
+async def run_load(server, sessions, turns, concurrency, fast_path_share, seed):
+    import httpx
+
+    rng = random.Random(seed)
+    latencies, errors = [], []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(session_rng):
+        async with gate:
+            await run_session(client, session_rng, turns, fast_path_share, latencies, errors)
+
+    # Unhandled errors become 500s and are counted instead of aborting the run
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(random.Random(rng.random())) for _ in range(sessions)))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies, errors
+
+
+# ---------- Cold start ----------
+COLD_START_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+warm = server.warmup()
+print(json.dumps({
+    "import_ms": round((imported - started) * 1000, 1),
+    "warmup_ms": round((time.perf_counter() - imported) * 1000, 1),
+    "components_ms": warm["warmup_ms"],
+}))
+"""
+
+
+def measure_cold_start(runs: int = 3) -> dict:
+    """Median import and warm-up times of the server module over fresh interpreters."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get("PYTHONPATH")])),
+               PYTHONWARNINGS="ignore")
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], env=env, capture_output=True, text=True, check=True)
+        sample = json.loads(out.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        samples.append(sample)
+    return {
+        "runs": runs,
+        "process_ms": statistics.median(s["process_ms"] for s in samples),
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "warmup_ms": statistics.median(s["warmup_ms"] for s in samples),
+        "components_ms": {
+            name: statistics.median(s["components_ms"][name] for s in samples) for name in samples[0]["components_ms"]
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=32, help="Chat sessions to run")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions in flight at once")
+    parser.add_argument("--fast-path-share", type=float, default=0.3,
+                        help="Share of questions the fast path answers without the model")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Simulated model latency per call")
+    parser.add_argument("--floats", type=int, default=300, help="Synthetic floats per year")
+    parser.add_argument("--workdir", help="Scratch directory (default: a new temp dir)")
+    parser.add_argument("--store", help="SESSION_STORE_URL (default: SQLite in the workdir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cold-start", action="store_true", help="Also measure server import and warm-up time")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="thalassa-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    # Modules resolve ./LOCAL/Resources relative to the working directory
+    os.chdir(workdir)
+    sys.path.insert(0, HERE)
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ.setdefault("TRACE_FILE", os.path.join(workdir, "traces.jsonl"))
+    os.environ["SESSION_STORE_URL"] = args.store or "sqlite:///./LOCAL/Resources/sessions.sqlite"
+
+    db_path = "./LOCAL/Resources/argo.db"
+    if not os.path.exists(db_path):
+        started = time.perf_counter()
+        build_synthetic_db(db_path, floats=args.floats)
+        print(f"[bench] synthetic database built in {time.perf_counter() - started:.1f}s ({workdir})", file=sys.stderr)
+
+    cold_start = measure_cold_start() if args.cold_start else None
+
+    import server
+    from tracing import histograms
+
+    histograms.reset()
+    server.migrate_store()
+    server.start_background_workers()
+    try:
+        elapsed, latencies, errors = asyncio.run(run_load(
+            server, args.sessions, args.turns, args.concurrency, args.fast_path_share, args.seed
+        ))
+    finally:
+        # Let queued summaries land so their writes are part of the contention numbers
+        server.summarizer.stop(timeout=30)
+
+    stages = histograms.snapshot()
+    report = {
+        "workdir": workdir,
+        "store": os.environ["SESSION_STORE_URL"],
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "turns": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "turn_latency_ms": {
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+        "stages": {
+            name: {k: h[k] for k in ("count", "mean_ms", "p50_ms", "p95_ms", "max_ms")}
+            for name, h in stages.items()
+        },
+        "write_contention": {
+            name: stages[name] for name in ("persist", "persist.lock_wait", "persist.summary") if name in stages
+        },
+        "error_samples": errors[:5],
+    }
+    if cold_start:
+        report["cold_start"] = cold_start
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"\n{report['turns']} turns in {report['elapsed_s']}s "
+          f"({report['throughput_turns_per_s']} turns/s, {report['errors']} errors) "
+          f"— {args.sessions} sessions, concurrency {args.concurrency}, store {report['store']}")
+    t = report["turn_latency_ms"]
+    print(f"turn latency ms: p50 {t['p50']}  p95 {t['p95']}  p99 {t['p99']}  max {t['max']}\n")
+    print(f"{'stage':<22}{'count':>8}{'mean ms':>11}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>11}")
+    for name, h in report["stages"].items():
+        print(f"{name:<22}{h['count']:>8}{h['mean_ms']:>11}{h['p50_ms']:>10}{h['p95_ms']:>10}{h['max_ms']:>11}")
+    if cold_start:
+        print(f"\ncold start (median of {cold_start['runs']}): process {cold_start['process_ms']} ms, "
+              f"import server {cold_start['import_ms']} ms, first /warmup {cold_start['warmup_ms']} ms "
+              f"{cold_start['components_ms']}")
+    for sample in report["error_samples"]:
+        print(f"[bench] error: {sample}")
+
+
+if __name__ == "__main__":
+    main()
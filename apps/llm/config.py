@@ -3,4 +3,10 @@ import os
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
\ No newline at end of file
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Chat sessions/messages store, as <backend>:///<path> (backends: sqlite, duckdb)
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "sqlite:///./LOCAL/Resources/sessions.sqlite")
+
+# Chat model backend: "groq", or "stub" for the offline scripted model in stub_model.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
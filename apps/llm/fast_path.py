@@ -0,0 +1,155 @@
+"""Deterministic answers for formulaic questions, without going through the LLM loop.
+
+Questions like "average temperature in the Arabian Sea in August 2023" map onto a
+fixed, parameterized aggregate. `try_answer` recognises those shapes, resolves the
+region against the region dimension (see regions.py), runs the prebuilt query and
+formats the answer. Anything it does not recognise returns None and goes to the agent.
+"""
+import calendar
+import functools
+import re
+
+import duckdb
+
+import regions
+from query_cache import dataset_version
+
+DB_PATH = "./LOCAL/Resources/argo.db"
+YEARS = (2022, 2023, 2024)
+
+# variable keyword -> (column, qc column, unit, label)
+VARIABLES = {
+    "temperature": ("temp_c", "temp_qc", "°C", "temperature"),
+    "temp": ("temp_c", "temp_qc", "°C", "temperature"),
+    "salinity": ("sal_psu", "psal_qc", "PSU", "salinity"),
+    "depth": ("depth_m", "pres_qc", "m", "depth"),
+    "pressure": ("depth_m", "pres_qc", "m", "depth"),
+}
+AGGREGATES = {
+    "average": ("AVG", "average"), "mean": ("AVG", "average"), "avg": ("AVG", "average"),
+    "minimum": ("MIN", "minimum"), "min": ("MIN", "minimum"), "lowest": ("MIN", "minimum"),
+    "maximum": ("MAX", "maximum"), "max": ("MAX", "maximum"), "highest": ("MAX", "maximum"),
+}
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+_QUESTION = re.compile(
+    r"^(?:(?:what|how)\s+(?:is|was|'s)\s+|tell me\s+|give me\s+|show\s+)?(?:the\s+)?"
+    rf"(?P<agg>{'|'.join(AGGREGATES)})\s+(?:sea\s+)?"
+    rf"(?P<var>{'|'.join(VARIABLES)})\s+"
+    r"(?:in|of|for|at|across)\s+(?:the\s+)?(?P<region>.+?)"
+    rf"(?:\s+(?:in|during|for)\s+(?P<when>(?:{'|'.join(MONTHS)})(?:\s+(?:of\s+)?\d{{4}})?|\d{{4}}))?"
+    r"\s*[?.!]*$"
+)
+
+
+def has_clean_columns() -> bool:
+    """True if ingest has added the QC-applied `*_good` columns to every year's table.
+
+    Checked once per database version, so re-ingesting switches over without a restart.
+    """
+    return _has_clean_columns(dataset_version(DB_PATH))
+
+
+@functools.lru_cache(maxsize=1)
+def _has_clean_columns(version: str) -> bool:
+    with duckdb.connect(DB_PATH, read_only=True) as con:
+        found = con.execute(
+            "SELECT COUNT(DISTINCT table_name) FROM duckdb_columns() WHERE column_name = 'temp_c_good' AND table_name IN ?",
+            [[f"argo{year}" for year in YEARS]],
+        ).fetchone()[0]
+    return found == len(YEARS)
+
+
+def _parse_when(when):
+    """Return (month, years) for the optional time phrase, or None if it is unusable."""
+    if not when:
+        return None, YEARS
+    month, years = None, YEARS
+    for token in when.split():
+        if token == "of":
+            continue
+        if token.isdigit():
+            if int(token) not in YEARS:
+                return None
+            years = (int(token),)
+        elif token in MONTHS:
+            month = MONTHS[token]
+        else:
+            return None
+    return month, years
+
+
+def match(question: str):
+    """Return the parameters of a recognised question template, or None."""
+    m = _QUESTION.match(" ".join(question.lower().split()))
+    if not m:
+        return None
+    when = _parse_when(m.group("when"))
+    region = regions.resolve(m.group("region"))
+    if when is None or region is None:
+        return None
+    return {
+        "aggregate": AGGREGATES[m.group("agg")],
+        "variable": VARIABLES[m.group("var")],
+        "region": region.name,
+        "region_id": region.region_id,
+        "month": when[0],
+        "years": when[1],
+    }
+
+
+def build_query(intent: dict):
+    """Prebuilt QC-filtered aggregate for a matched template, as (sql, params)."""
+    fn = intent["aggregate"][0]
+    column, qc, _, _ = intent["variable"]
+    # Integer region ids once ingest has tagged the tables, the name otherwise
+    by_id = intent["region_id"] is not None and regions.has_region_ids()
+    region_filter = "region_id = ?" if by_id else "region_name = ?"
+    if has_clean_columns():
+        column = f"{column}_good"
+        where = f"{region_filter} AND {column} IS NOT NULL"
+    else:
+        where = f"{region_filter} AND {column} IS NOT NULL AND NOT ISNAN({column}) AND {qc} < 3"
+    params = []
+    selects = []
+    for year in intent["years"]:
+        month_filter = " AND EXTRACT(MONTH FROM date) = ?" if intent["month"] else ""
+        selects.append(f"SELECT {column} AS v FROM argo{year} WHERE {where}{month_filter}")
+        params.append(intent["region_id"] if by_id else intent["region"])
+        if intent["month"]:
+            params.append(intent["month"])
+    sql = f"SELECT {fn}(v), COUNT(*) FROM ({' UNION ALL '.join(selects)})"
+    return sql, params
+
+
+def format_answer(intent: dict, value, count: int) -> str:
+    if value is None or count == 0:
+        return "No valid data available."
+    _, _, unit, label = intent["variable"]
+    period = ""
+    if intent["month"]:
+        period = f" in {calendar.month_name[intent['month']]}"
+    if len(intent["years"]) == 1:
+        period += f" {intent['years'][0]}" if intent["month"] else f" in {intent['years'][0]}"
+    else:
+        period += f" across {intent['years'][0]}–{intent['years'][-1]}"
+    return (
+        f"The {intent['aggregate'][1]} {label} in the {intent['region']}{period} "
+        f"was {value:.2f} {unit}, based on {count:,} quality-controlled measurements."
+    )
+
+
+def try_answer(question: str):
+    """Answer `question` directly if it matches a known template, otherwise None."""
+    try:
+        intent = match(question)
+        if intent is None:
+            return None
+        sql, params = build_query(intent)
+        with duckdb.connect(DB_PATH, read_only=True) as con:
+            value, count = con.execute(sql, params).fetchone()
+    except duckdb.Error as e:
+        print(f"[fast_path] falling back to agent: {e}")
+        return None
+    return format_answer(intent, value, count)
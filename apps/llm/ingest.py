@@ -0,0 +1,401 @@
+"""Derived tables built on top of the yearly Argo tables.
+
+`data_load.ipynb` loads the raw CSVs into `argo{year}`, `distinct_float_positions_{year}`
+and `latest_float_positions_{year}`. The steps here run afterwards and build the
+serving tables the agent and the API read from:
+
+    python ingest.py --year 2023
+    python ingest.py --year 2022 --year 2023 --year 2024 --steps samples
+
+Steps always run in the order of STEPS, since later ones read what earlier ones build.
+"""
+import argparse
+
+import duckdb
+import numpy as np
+
+DB_PATH = "./LOCAL/Resources/argo.db"
+
+# ---------- Region dimension ----------
+# Extra spellings per canonical region name, on top of the generated ones
+REGION_ALIASES = {
+    "Bay of Bengal": ["bengal bay"],
+}
+
+
+def region_aliases(name: str) -> list:
+    """Lower-case alternative spellings of a region name ("North Atlantic Ocean" -> "north atlantic")."""
+    lowered = name.lower()
+    aliases = {a.lower() for a in REGION_ALIASES.get(name, [])}
+    if lowered.endswith(" ocean") and len(lowered.split()) > 2:
+        aliases.add(lowered[:-len(" ocean")])
+    aliases.discard(lowered)
+    return sorted(aliases)
+
+
+def build_regions(con, year: int):
+    """Add `argo{year}`'s regions to the `regions` dimension and tag its rows with `region_id`.
+
+    Ids are stable across runs and years: known names keep their id, new names get
+    the next free ones. Each region's bounding box grows to cover every position
+    tagged with it, so a region filter can be paired with lat/lon range predicates.
+    """
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS regions (
+        region_id SMALLINT PRIMARY KEY,
+        name VARCHAR NOT NULL UNIQUE,
+        aliases VARCHAR[],
+        min_lat DOUBLE, max_lat DOUBLE,
+        min_lon DOUBLE, max_lon DOUBLE
+    )
+    """)
+    new_names = [r[0] for r in con.execute(f"""
+        SELECT DISTINCT region_name FROM argo{year}
+        WHERE region_name IS NOT NULL AND region_name NOT IN (SELECT name FROM regions)
+        ORDER BY region_name
+    """).fetchall()]
+    next_id = con.execute("SELECT COALESCE(MAX(region_id), 0) + 1 FROM regions").fetchone()[0]
+    if new_names:
+        con.executemany(
+            "INSERT INTO regions (region_id, name, aliases) VALUES (?, ?, ?)",
+            [(next_id + i, name, region_aliases(name)) for i, name in enumerate(new_names)],
+        )
+    con.execute(f"""
+    UPDATE regions SET
+        min_lat = LEAST(COALESCE(regions.min_lat, b.min_lat), b.min_lat),
+        max_lat = GREATEST(COALESCE(regions.max_lat, b.max_lat), b.max_lat),
+        min_lon = LEAST(COALESCE(regions.min_lon, b.min_lon), b.min_lon),
+        max_lon = GREATEST(COALESCE(regions.max_lon, b.max_lon), b.max_lon)
+    FROM (
+        SELECT region_name, MIN(lat) AS min_lat, MAX(lat) AS max_lat, MIN(lon) AS min_lon, MAX(lon) AS max_lon
+        FROM argo{year} GROUP BY region_name
+    ) b
+    WHERE regions.name = b.region_name
+    """)
+
+    con.execute(f"ALTER TABLE argo{year} ADD COLUMN IF NOT EXISTS region_id SMALLINT")
+    con.execute(f"UPDATE argo{year} SET region_id = r.region_id FROM regions r WHERE argo{year}.region_name = r.name")
+    total = con.execute("SELECT COUNT(*) FROM regions").fetchone()[0]
+    print(f"[ingest] regions: {len(new_names)} new from argo{year}, {total} total; argo{year}.region_id set")
+
+
+# ---------- Clean analytic columns ----------
+# raw column -> QC flag column; `<raw>_good` keeps a value only if it is a number and passed QC
+CLEAN_COLUMNS = {
+    "temp_c": "temp_qc",
+    "sal_psu": "psal_qc",
+    "depth_m": "pres_qc",
+}
+QC_GOOD_MAX = 3              # QC flags below this are good / probably good
+SORT_KEY = "platform_id, date, depth_m"  # prefixed with region_id once regions are tagged
+
+
+def build_clean_columns(con, year: int):
+    """Rewrite `argo{year}` with QC-applied `*_good` columns, sorted by region, float and time.
+
+    NaN, NULL and failed-QC values all become NULL in the `*_good` columns, so
+    aggregates over them need no extra filters. Sorting by (region_id, platform_id,
+    date) keeps each region's and each float's rows in a few row groups, which lets
+    DuckDB's zone maps (its per-row-group min/max statistics) skip the rest for
+    region, per-float and date-range scans. Safe to re-run.
+    """
+    raw = [
+        r[0] for r in con.execute(
+            "SELECT column_name FROM duckdb_columns() WHERE table_name = ? AND schema_name = 'main' ORDER BY column_index",
+            [f"argo{year}"],
+        ).fetchall()
+        if not r[0].endswith("_good")
+    ]
+    sort_key = f"region_id, {SORT_KEY}" if "region_id" in raw else SORT_KEY
+    good = ",\n        ".join(
+        # ISNAN(NULL) is NULL, so missing values fall through to NULL as well
+        f"CASE WHEN NOT ISNAN({col}) AND {qc} < {QC_GOOD_MAX} THEN {col} END AS {col}_good"
+        for col, qc in CLEAN_COLUMNS.items()
+    )
+    con.execute("BEGIN")
+    try:
+        con.execute(f"""
+        CREATE OR REPLACE TABLE argo{year}_clean AS
+        SELECT {", ".join(raw)},
+            {good}
+        FROM argo{year}
+        ORDER BY {sort_key};
+        """)
+        con.execute(f"DROP TABLE argo{year}")
+        con.execute(f"ALTER TABLE argo{year}_clean RENAME TO argo{year}")
+        # Left by earlier versions of this step; nothing reads it
+        con.execute(f"DROP TABLE IF EXISTS argo{year}_row_groups")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    counts = con.execute(
+        f"SELECT COUNT(*), {', '.join(f'COUNT({c}_good)' for c in CLEAN_COLUMNS)} FROM argo{year}"
+    ).fetchone()
+    kept = ", ".join(f"{c}_good {n}" for c, n in zip(CLEAN_COLUMNS, counts[1:]))
+    print(f"[ingest] argo{year}: {counts[0]} rows, good values: {kept}")
+
+
+# ---------- Stratified samples ----------
+SAMPLE_FRACTION = 0.02       # share of each (region, month) stratum kept
+SAMPLE_MIN_ROWS = 500        # small strata are kept (almost) whole
+
+
+def build_sample_table(con, year: int, fraction: float = SAMPLE_FRACTION, min_rows: int = SAMPLE_MIN_ROWS):
+    """Create `argo{year}_sample`, a stratified row sample of `argo{year}`.
+
+    Strata are (region_name, month). Every sampled row carries `_w`, the number of
+    source rows it stands for (stratum rows / sampled stratum rows), so weighted
+    aggregates over the sample estimate aggregates over the full table.
+    """
+    con.execute(f"""
+    CREATE OR REPLACE TABLE argo{year}_sample AS
+    WITH strata AS (
+        SELECT region_name, EXTRACT(MONTH FROM date) AS month, COUNT(*) AS stratum_rows
+        FROM argo{year}
+        GROUP BY ALL
+    ),
+    -- Draw the random number per source row; a bare random() in the WHERE clause
+    -- only references stratum columns and would be pushed down into `strata`
+    draws AS (
+        SELECT *, random() AS _u FROM argo{year}
+    ),
+    picked AS (
+        SELECT a.*, s.stratum_rows
+        FROM draws a
+        JOIN strata s
+          ON a.region_name IS NOT DISTINCT FROM s.region_name
+         AND EXTRACT(MONTH FROM a.date) = s.month
+        WHERE a._u < GREATEST({float(fraction)}, {int(min_rows)} / s.stratum_rows)
+    )
+    SELECT * EXCLUDE (stratum_rows, _u),
+        stratum_rows / COUNT(*) OVER (PARTITION BY region_name, EXTRACT(MONTH FROM date)) AS _w
+    FROM picked
+    ORDER BY region_name, date;
+    """)
+    rows = con.execute(f"SELECT COUNT(*), SUM(_w) FROM argo{year}_sample").fetchone()
+    print(f"[ingest] argo{year}_sample: {rows[0]} rows standing for {int(rows[1] or 0)}")
+
+
+# ---------- Gridded climatology ----------
+STANDARD_DEPTHS = (0, 10, 50, 100, 200, 500, 1000, 2000)  # metres
+GRID_DEG = 1.0               # cell size; cell (0, 0) is the one at lat -90, lon -180
+GRID_VARIABLES = ("temp_c", "sal_psu")
+SURFACE_REACH_M = 10         # a profile's shallowest value stands for 0 m if it is at most this deep
+MAX_GAP_M = 500              # never interpolate between measurements further apart than this
+
+
+def _interpolate_variable(year: int, variable: str) -> str:
+    """SQL for `variable` of every profile linearly interpolated onto STANDARD_DEPTHS."""
+    levels = ", ".join(str(d) for d in STANDARD_DEPTHS)
+    return f"""
+    SELECT t.platform_id, t.date, t.depth_m,
+        CASE
+            WHEN a.depth_m = t.depth_m THEN a.value
+            WHEN a.depth_m IS NOT NULL AND b.depth_m IS NOT NULL AND b.depth_m - a.depth_m <= {MAX_GAP_M}
+                THEN a.value + (b.value - a.value) * (t.depth_m - a.depth_m) / (b.depth_m - a.depth_m)
+            WHEN a.depth_m IS NULL AND t.depth_m = {STANDARD_DEPTHS[0]} AND b.depth_m <= {SURFACE_REACH_M}
+                THEN b.value
+        END AS {variable}
+    FROM (
+        SELECT p.platform_id, p.date, l.depth_m
+        FROM (SELECT DISTINCT platform_id, date FROM measured_{variable}) p,
+             (SELECT UNNEST([{levels}])::DOUBLE AS depth_m) l
+    ) t
+    -- a: deepest measurement at or above the level, b: shallowest at or below it
+    ASOF LEFT JOIN measured_{variable} a
+      ON t.platform_id = a.platform_id AND t.date = a.date AND t.depth_m >= a.depth_m
+    ASOF LEFT JOIN measured_{variable} b
+      ON t.platform_id = b.platform_id AND t.date = b.date AND t.depth_m <= b.depth_m
+    """
+
+
+def build_climatology_grid(con, year: int):
+    """Interpolate every profile onto standard depths and grid the results per month.
+
+    `argo{year}_levels` holds one row per (profile, standard depth) with temperature
+    and salinity linearly interpolated between the profile's QC-good measurements
+    (no extrapolation, except that a value from the top SURFACE_REACH_M stands
+    for 0 m). `argo{year}_grid` averages those onto GRID_DEG cells per month: one
+    row per (variable, depth, month, cell) with the mean and the number of profiles,
+    which the API packs into global float32 layers. Needs the clean step.
+    """
+    columns = {r[0] for r in con.execute(
+        "SELECT column_name FROM duckdb_columns() WHERE table_name = ? AND schema_name = 'main'", [f"argo{year}"]
+    ).fetchall()}
+    if "depth_m_good" not in columns:
+        raise ValueError(f"argo{year} has no QC-applied columns; run the clean step first")
+
+    measured = ",\n    ".join(f"""measured_{v} AS (
+        SELECT platform_id, date, depth_m_good AS depth_m, AVG({v}_good) AS value
+        FROM argo{year}
+        WHERE depth_m_good IS NOT NULL AND {v}_good IS NOT NULL
+        GROUP BY ALL
+    )""" for v in GRID_VARIABLES)
+    interpolated = ",\n    ".join(
+        f"interp_{v} AS ({_interpolate_variable(year, v)})" for v in GRID_VARIABLES
+    )
+    joined = " ".join(
+        f"FULL JOIN interp_{v} USING (platform_id, date, depth_m)" for v in GRID_VARIABLES[1:]
+    )
+    con.execute(f"""
+    CREATE OR REPLACE TABLE argo{year}_levels AS
+    WITH positions AS (
+        SELECT platform_id, date, ANY_VALUE(lat) AS lat, ANY_VALUE(lon) AS lon
+        FROM argo{year}
+        WHERE lat IS NOT NULL AND lon IS NOT NULL
+        GROUP BY ALL
+    ),
+    {measured},
+    {interpolated}
+    SELECT platform_id, date, p.lat, p.lon, depth_m, {", ".join(GRID_VARIABLES)}
+    FROM interp_{GRID_VARIABLES[0]} {joined}
+    JOIN positions p USING (platform_id, date)
+    WHERE {" OR ".join(f"{v} IS NOT NULL" for v in GRID_VARIABLES)}
+    ORDER BY platform_id, date, depth_m;
+    """)
+
+    rows = 180 / GRID_DEG
+    cols = 360 / GRID_DEG
+    unpivot = " UNION ALL ".join(
+        f"SELECT '{v}' AS variable, depth_m, month, lat_idx, lon_idx, {v} AS value FROM cells WHERE {v} IS NOT NULL"
+        for v in GRID_VARIABLES
+    )
+    con.execute(f"""
+    CREATE OR REPLACE TABLE argo{year}_grid AS
+    WITH cells AS (
+        SELECT EXTRACT(MONTH FROM date)::TINYINT AS month,
+            LEAST(FLOOR((lat + 90) / {GRID_DEG}), {rows - 1})::SMALLINT AS lat_idx,
+            -- ((x % 360) + 360) % 360 wraps any longitude, including 180, onto [0, 360)
+            LEAST(FLOOR((((lon + 180) % 360) + 360) % 360 / {GRID_DEG}), {cols - 1})::SMALLINT AS lon_idx,
+            *
+        FROM argo{year}_levels
+    )
+    SELECT variable, depth_m::SMALLINT AS depth_m, month, lat_idx, lon_idx,
+        AVG(value)::FLOAT AS mean, COUNT(*)::INTEGER AS n
+    FROM ({unpivot})
+    GROUP BY ALL
+    ORDER BY variable, depth_m, month, lat_idx, lon_idx;
+    """)
+    counts = con.execute(f"SELECT (SELECT COUNT(*) FROM argo{year}_levels), COUNT(*) FROM argo{year}_grid").fetchone()
+    print(f"[ingest] argo{year}_levels: {counts[0]} profile levels; argo{year}_grid: {counts[1]} cells "
+          f"({GRID_DEG}° x {len(STANDARD_DEPTHS)} depths x 12 months)")
+
+
+# ---------- Trajectory simplification ----------
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _cross(u, v) -> np.ndarray:
+    return np.array([u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0]])
+
+
+def _arc_distance_km(points, a, b) -> np.ndarray:
+    """Great-circle distance from each of `points` to the arc a-b (all unit vectors)."""
+    normal = _cross(a, b)
+    length = np.linalg.norm(normal)
+    if length < 1e-12:  # a and b coincide: distance to the point
+        return EARTH_RADIUS_KM * np.arccos(np.clip(points @ a, -1, 1))
+    normal = normal / length
+    # One product for all the dot products; (a x p).n = p.(n x a) and (p x b).n = p.(b x n)
+    dots = points @ np.stack([normal, a, b, _cross(normal, a), _cross(b, normal)], axis=1)
+    cross_track = np.arcsin(np.clip(np.abs(dots[:, 0]), 0, 1))
+    to_ends = np.arccos(np.clip(np.maximum(dots[:, 1], dots[:, 2]), -1, 1))
+    # The perpendicular foot lies on the arc only if the point is "between" a and b
+    between = (dots[:, 3] >= 0) & (dots[:, 4] >= 0)
+    return EARTH_RADIUS_KM * np.where(between, cross_track, to_ends)
+
+
+def path_significance(lat, lon) -> np.ndarray:
+    """Douglas–Peucker significance (km) of every point of one time-ordered trajectory.
+
+    A point is kept by Douglas–Peucker at tolerance t exactly when its significance
+    exceeds t: it is the point's distance from the chord that split it off, capped
+    by the significance of the split above it. End points are infinitely significant.
+    """
+    n = len(lat)
+    significance = np.zeros(n)
+    significance[[0, -1]] = np.inf
+    points = _unit_vectors(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, cap = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _arc_distance_km(points[first + 1:last], points[first], points[last])
+        split = first + 1 + int(np.argmax(distances))
+        significance[split] = min(float(distances[split - first - 1]), cap)
+        stack.append((first, split, significance[split]))
+        stack.append((split, last, significance[split]))
+    return significance
+
+
+def build_path_significance(con, year: int):
+    """Add `significance_km` to `distinct_float_positions_{year}` for zoom-dependent path simplification.
+
+    Each float's positions are ranked by Douglas–Peucker on the sphere, so the
+    API returns a simplified trajectory for a tolerance with a plain
+    `significance_km > tolerance` filter instead of simplifying per request.
+    """
+    import pandas as pd
+
+    table = f"distinct_float_positions_{year}"
+    data = con.execute(f"""
+        SELECT rowid AS rid, platform_id, lat, lon FROM {table}
+        WHERE lat IS NOT NULL AND lon IS NOT NULL
+        ORDER BY platform_id, date, rowid
+    """).fetchnumpy()
+    significance = np.empty(len(data["rid"]))
+    _, starts = np.unique(data["platform_id"], return_index=True)
+    for start, end in zip(starts, np.append(starts[1:], len(significance))):
+        significance[start:end] = path_significance(data["lat"][start:end], data["lon"][start:end])
+
+    scores = pd.DataFrame({"rid": data["rid"], "significance_km": significance})
+    con.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS significance_km DOUBLE")
+    con.register("path_significance", scores)
+    try:
+        con.execute(f"""
+        UPDATE {table} SET significance_km = s.significance_km
+        FROM path_significance s
+        WHERE {table}.rowid = s.rid
+        """)
+    finally:
+        con.unregister("path_significance")
+    kept = {t: int(np.count_nonzero(significance > t)) for t in (1, 10, 100)}
+    print(f"[ingest] {table}: significance for {len(significance)} positions of {len(starts)} floats; "
+          f"kept at 1/10/100 km: {kept[1]}/{kept[10]}/{kept[100]}")
+
+
+STEPS = {
+    "regions": build_regions,
+    "clean": build_clean_columns,
+    "samples": build_sample_table,
+    "grids": build_climatology_grid,
+    "paths": build_path_significance,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build derived Argo serving tables.")
+    parser.add_argument("--db", default=DB_PATH, help="Path to argo.db")
+    parser.add_argument("--year", type=int, action="append", required=True, help="Year to process (repeatable)")
+    parser.add_argument("--steps", nargs="+", choices=sorted(STEPS), default=list(STEPS), help="Steps to run (default: all)")
+    args = parser.parse_args()
+
+    con = duckdb.connect(args.db)
+    try:
+        for year in args.year:
+            for name, step in STEPS.items():
+                if name in args.steps:
+                    step(con, year)
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
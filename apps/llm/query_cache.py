@@ -0,0 +1,216 @@
+"""Result cache for the agent's SQL tool.
+
+The LLM tends to regenerate near-identical SQL for repeat questions. Queries are
+keyed by a canonical form of their DuckDB parse tree (whitespace, keyword and
+table name case, ILIKE literal case and the order of AND/OR terms and IN lists
+do not matter), scoped to the current dataset version, kept in an in-memory LRU
+bounded by payload size and written through to a small SQLite file so the cache
+survives restarts.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import duckdb
+
+# Operators whose right-hand literal is compared case-insensitively
+_CASE_INSENSITIVE_OPS = {"~~*", "!~~*"}
+
+_parser = duckdb.connect()
+_parser_lock = threading.Lock()
+
+
+def _canonical(node):
+    """Recursively strip positions and put commutative parts in a stable order."""
+    if isinstance(node, list):
+        return [_canonical(n) for n in node]
+    if not isinstance(node, dict):
+        return node
+
+    out = {k: _canonical(v) for k, v in node.items() if k != "query_location"}
+
+    # Column names and aliases stay as written: they name the result columns, and
+    # the parse tree does not record whether an identifier was quoted
+    if out.get("type") == "BASE_TABLE":
+        out["table_name"] = out["table_name"].lower()
+        out["schema_name"] = out["schema_name"].lower()
+
+    children = out.get("children")
+    if isinstance(children, list):
+        if out.get("class") == "CONJUNCTION":
+            out["children"] = sorted(children, key=_sort_key)
+        elif out.get("type") in ("COMPARE_IN", "COMPARE_NOT_IN"):
+            out["children"] = children[:1] + sorted(children[1:], key=_sort_key)
+        elif out.get("function_name") in _CASE_INSENSITIVE_OPS and len(children) == 2:
+            value = children[1].get("value", {}) if isinstance(children[1], dict) else {}
+            if isinstance(value.get("value"), str):
+                value["value"] = value["value"].lower()
+    return out
+
+
+def _sort_key(node) -> str:
+    return json.dumps(node, sort_keys=True)
+
+
+def normalize_sql(query: str) -> str:
+    """Return a canonical string for `query` that is stable across formatting."""
+    with _parser_lock:
+        raw = _parser.execute("SELECT json_serialize_sql(?)", [query]).fetchone()[0]
+    tree = json.loads(raw)
+    if tree.get("error"):
+        # Not parseable by DuckDB: fall back to whitespace normalization only
+        return " ".join(query.strip().rstrip(";").split())
+    return json.dumps(_canonical(tree["statements"]), sort_keys=True, separators=(",", ":"))
+
+
+def dataset_version(db_path: str) -> str:
+    """Version token for the analytics database; changes whenever the file is rewritten."""
+    override = os.getenv("THALASSA_DATASET_VERSION")
+    if override:
+        return override
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return "missing"
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+class QueryCache:
+    """Size-bounded LRU of tool results keyed by normalized SQL."""
+
+    def __init__(self, db_path: str, store_path: str, max_bytes: int = 64 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (result, size, elapsed)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.version = dataset_version(db_path)
+
+        self._store = None
+        try:
+            os.makedirs(os.path.dirname(store_path) or ".", exist_ok=True)
+            self._store = sqlite3.connect(store_path, check_same_thread=False)
+            self._store.execute("""
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    key TEXT PRIMARY KEY,
+                    version TEXT,
+                    payload TEXT,
+                    size INTEGER,
+                    elapsed REAL,
+                    last_used REAL
+                )
+            """)
+            self._load()
+        except sqlite3.Error as e:
+            print(f"[query_cache] persistence disabled: {e}")
+            self._store = None
+
+    # ---------- Persistence ----------
+    def _load(self):
+        """Warm the LRU from disk, dropping entries from older dataset versions."""
+        self._store.execute("DELETE FROM query_cache WHERE version != ?", [self.version])
+        self._store.commit()
+        rows = self._store.execute(
+            "SELECT key, payload, size, elapsed FROM query_cache WHERE version = ? ORDER BY last_used DESC",
+            [self.version],
+        ).fetchall()
+        for key, payload, size, elapsed in rows:
+            if self._bytes + size > self.max_bytes:
+                break
+            self._entries[key] = (json.loads(payload), size, elapsed)
+            self._entries.move_to_end(key, last=False)
+            self._bytes += size
+
+    def _persist(self, key, payload, size, elapsed):
+        if self._store is None:
+            return
+        try:
+            self._store.execute(
+                "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?, ?)",
+                [key, self.version, payload, size, elapsed, time.time()],
+            )
+            self._store.commit()
+        except sqlite3.Error as e:
+            print(f"[query_cache] write failed: {e}")
+
+    def _forget(self, keys):
+        if self._store is None or not keys:
+            return
+        try:
+            self._store.executemany("DELETE FROM query_cache WHERE key = ?", [[k] for k in keys])
+            self._store.commit()
+        except sqlite3.Error as e:
+            print(f"[query_cache] delete failed: {e}")
+
+    # ---------- Cache API ----------
+    def _check_version(self):
+        current = dataset_version(self.db_path)
+        if current != self.version:
+            self.version = current
+            self._entries.clear()
+            self._bytes = 0
+            if self._store is not None:
+                self._store.execute("DELETE FROM query_cache WHERE version != ?", [current])
+                self._store.commit()
+
+    def key_for(self, query: str, variant: str = "") -> str:
+        canonical = normalize_sql(query)
+        return hashlib.sha256(f"{variant}\x00{canonical}".encode()).hexdigest()
+
+    def get(self, query: str, variant: str = ""):
+        key = self.key_for(query, variant)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return entry[0]
+
+    def put(self, query: str, result: dict, elapsed: float, variant: str = "", version: str = None):
+        """Cache `result`; with `version`, only if that is still the dataset version it was computed on."""
+        key = self.key_for(query, variant)
+        payload = json.dumps(result)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self.version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (result, size, elapsed)
+            self._bytes += size
+            evicted = []
+            while self._bytes > self.max_bytes:
+                old_key, (_, old_size, _) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(old_key)
+            self._persist(key, payload, size, elapsed)
+            self._forget(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "dataset_version": self.version,
+            }
@@ -0,0 +1,214 @@
+"""Region dimension: canonical names, aliases, bounding boxes and integer ids.
+
+`ingest.py --steps regions` builds the `regions` table and tags every row of
+`argo{year}` with a small integer `region_id`. This module loads the dimension
+once per database version, resolves free text ("arabian sea", "north atlantic",
+"bay of bengall") to a region through names, aliases and fuzzy matching, and
+rewrites `region_name` filters in agent SQL into `region_id` comparisons plus the
+region's lat/lon box, so region-filtered scans compare integers and can skip row
+groups.
+
+On databases without the dimension the names come from the per-year
+`argo{year}_positions_region` tables and no SQL is rewritten.
+"""
+import difflib
+import functools
+import json
+import re
+from typing import NamedTuple, Optional
+
+import duckdb
+
+from query_cache import dataset_version
+
+DB_PATH = "./LOCAL/Resources/argo.db"
+YEARS = (2022, 2023, 2024)
+FUZZY_CUTOFF = 0.85
+
+# Tables whose rows carry region_id once ingest has run
+_TAGGED_TABLE = re.compile(r"^argo\d{4}(_sample)?$")
+# ~~ is LIKE, ~~* is ILIKE
+_MATCH_OPERATORS = {"~~", "~~*"}
+
+
+class Region(NamedTuple):
+    region_id: Optional[int]
+    name: str
+    aliases: tuple = ()
+    min_lat: Optional[float] = None
+    max_lat: Optional[float] = None
+    min_lon: Optional[float] = None
+    max_lon: Optional[float] = None
+
+
+# The lookups below are cached per dataset version, so re-running ingest or
+# data_load is picked up without restarting the process.
+def load_regions() -> tuple:
+    """All known regions, from the `regions` dimension (or the legacy tables)."""
+    return _load_regions(dataset_version(DB_PATH))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_regions(version: str) -> tuple:
+    with duckdb.connect(DB_PATH, read_only=True) as con:
+        try:
+            rows = con.execute(
+                "SELECT region_id, name, aliases, min_lat, max_lat, min_lon, max_lon FROM regions ORDER BY region_id"
+            ).fetchall()
+            return tuple(Region(r[0], r[1], tuple(r[2] or ()), *r[3:]) for r in rows)
+        except duckdb.CatalogException:
+            pass
+        names = set()
+        for year in YEARS:
+            try:
+                rows = con.execute(
+                    f"SELECT DISTINCT region_name FROM argo{year}_positions_region WHERE region_name IS NOT NULL"
+                ).fetchall()
+            except duckdb.Error:
+                continue
+            names.update(r[0] for r in rows)
+    return tuple(Region(None, name) for name in sorted(names))
+
+
+@functools.lru_cache(maxsize=1)
+def _lookup(version: str) -> dict:
+    """Lower-cased name or alias -> Region."""
+    keys = {}
+    for region in _load_regions(version):
+        for alias in region.aliases:
+            keys.setdefault(alias.lower(), region)
+    # Canonical names win over aliases
+    keys.update({region.name.lower(): region for region in _load_regions(version)})
+    return keys
+
+
+def resolve(text: str) -> Optional[Region]:
+    """Map free text onto a region by name, alias or close spelling; None if nothing is close enough."""
+    return _resolve(text, dataset_version(DB_PATH))
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve(text: str, version: str) -> Optional[Region]:
+    keys = _lookup(version)
+    key = " ".join(text.lower().split())
+    if key.startswith("the "):
+        key = key[4:]
+    if key in keys:
+        return keys[key]
+    close = difflib.get_close_matches(key, list(keys), n=1, cutoff=FUZZY_CUTOFF)
+    return keys[close[0]] if close else None
+
+
+def has_region_ids() -> bool:
+    """True if the dimension exists and every yearly (and sample) table carries `region_id`."""
+    return _has_region_ids(dataset_version(DB_PATH))
+
+
+@functools.lru_cache(maxsize=1)
+def _has_region_ids(version: str) -> bool:
+    with duckdb.connect(DB_PATH, read_only=True) as con:
+        tables = {r[0]: r[1] for r in con.execute("""
+            SELECT t.table_name, COUNT(c.column_name)
+            FROM duckdb_tables() t
+            LEFT JOIN duckdb_columns() c
+              ON c.table_name = t.table_name AND c.schema_name = t.schema_name AND c.column_name = 'region_id'
+            WHERE t.schema_name = 'main'
+            GROUP BY t.table_name
+        """).fetchall()}
+    tagged = [name for name in tables if _TAGGED_TABLE.match(name)]
+    return "regions" in tables and bool(tagged) and all(tables[name] for name in tagged)
+
+
+# ---------- SQL rewrite ----------
+def _parse(con, sql: str) -> dict:
+    return json.loads(con.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+
+
+def _base_tables(node, out):
+    if isinstance(node, list):
+        for n in node:
+            _base_tables(n, out)
+    elif isinstance(node, dict):
+        if node.get("type") == "BASE_TABLE":
+            out.add(node["table_name"].lower())
+        for v in node.values():
+            _base_tables(v, out)
+    return out
+
+
+def _region_column(node):
+    if isinstance(node, dict) and node.get("class") == "COLUMN_REF" and node["column_names"][-1].lower() == "region_name":
+        return node["column_names"][:-1]
+    return None
+
+
+def _text_constant(node):
+    if isinstance(node, dict) and node.get("class") == "CONSTANT":
+        value = node["value"]
+        if value["type"]["id"] == "VARCHAR" and not value["is_null"]:
+            return value["value"]
+    return None
+
+
+def _region_predicate(node):
+    """(column qualifier, text) for `region_name = '…'` / `region_name [I]LIKE '…'` without wildcards."""
+    if node.get("class") == "COMPARISON" and node.get("type") == "COMPARE_EQUAL":
+        for column, constant in ((node["left"], node["right"]), (node["right"], node["left"])):
+            qualifier, text = _region_column(column), _text_constant(constant)
+            if qualifier is not None and text is not None:
+                return qualifier, text
+    if node.get("class") == "FUNCTION" and node.get("function_name") in _MATCH_OPERATORS and len(node["children"]) == 2:
+        qualifier, text = _region_column(node["children"][0]), _text_constant(node["children"][1])
+        if qualifier is not None and text is not None and not any(ch in text for ch in "%_"):
+            return qualifier, text
+    return None
+
+
+def _region_filter(con, qualifier, region: Region) -> dict:
+    """Parse tree for `region_id = N AND lat BETWEEN … AND lon BETWEEN …`."""
+    prefix = "".join(f'"{part}".' for part in qualifier)
+    terms = [f"{prefix}region_id = {int(region.region_id)}"]
+    if None not in (region.min_lat, region.max_lat, region.min_lon, region.max_lon):
+        # Every row of the region lies inside its box (ingest computes it from them);
+        # the extra ranges let zone maps on lat/lon skip row groups as well
+        terms.append(f"{prefix}lat BETWEEN {region.min_lat!r} AND {region.max_lat!r}")
+        terms.append(f"{prefix}lon BETWEEN {region.min_lon!r} AND {region.max_lon!r}")
+    return _parse(con, f"SELECT 1 FROM t WHERE {' AND '.join(terms)}")["statements"][0]["node"]["where_clause"]
+
+
+def rewrite_region_filters(con, query: str):
+    """Return `(sql, info)` with region_name filters replaced by region_id + bbox, or None.
+
+    Only equality / LIKE / ILIKE filters against a literal without wildcards are
+    rewritten, and only in queries that read nothing but yearly and sample tables.
+    `info["region_filters"]` lists how each literal was resolved.
+    """
+    if not has_region_ids():
+        return None
+    tree = _parse(con, query)
+    if tree.get("error"):
+        return None
+    tables = _base_tables(tree["statements"], set())
+    if not tables or not all(_TAGGED_TABLE.match(t) for t in tables):
+        return None
+
+    matches = []
+
+    def visit(node):
+        if isinstance(node, list):
+            return [visit(n) for n in node]
+        if not isinstance(node, dict):
+            return node
+        predicate = _region_predicate(node)
+        if predicate is not None:
+            region = resolve(predicate[1])
+            if region is not None and region.region_id is not None:
+                matches.append({"text": predicate[1], "region": region.name, "region_id": region.region_id})
+                return _region_filter(con, predicate[0], region)
+        return {k: visit(v) for k, v in node.items()}
+
+    tree["statements"] = visit(tree["statements"])
+    if not matches:
+        return None
+    sql = con.execute("SELECT json_deserialize_sql(?)", [json.dumps(tree)]).fetchone()[0]
+    return sql, {"region_filters": matches}
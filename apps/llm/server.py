@@ -1,41 +1,34 @@
 # server.py
+import time
+
+_import_started = time.perf_counter()
+
+import json
 import tempfile
 import uuid
 
-import duckdb
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from google import genai
-from langchain.memory import ConversationSummaryBufferMemory
-from langchain_core.messages import HumanMessage
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessageChunk, HumanMessage
 from pydantic import BaseModel
 
-from app import chat_model
-from config import GEMINI_API_KEY
-
-DB_PATH = "./LOCAL/Resources/argo.db"
+import fast_path
+import regions
+from app import get_app, get_chat_model, get_query_cache, open_db
+from config import GEMINI_API_KEY, SESSION_STORE_URL
+from session_memory import SessionCache, SessionMemory
+from session_store import open_store
+from summarizer import Summarizer
+from tracing import histograms, span, start_trace
 
-# ---------- Ensure DB + Tables ----------
-conn = duckdb.connect(DB_PATH)
-conn.execute("""
-CREATE TABLE IF NOT EXISTS sessions (
-    id VARCHAR PRIMARY KEY,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    summary TEXT
-)
-""")
-# messages table, using AUTOINCREMENT since DuckDB 0.10 supports it
-conn.execute("""
-CREATE SEQUENCE IF NOT EXISTS message_id_seq;
-CREATE TABLE IF NOT EXISTS messages (
-    id INTEGER DEFAULT nextval('message_id_seq'),
-    session_id VARCHAR,
-    role VARCHAR,
-    content TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-conn.close()
+# ---------- Session store ----------
+# Chat sessions live in their own write-optimized store; argo.db stays read-only.
+# Tables are created by the startup hook, not at import.
+store = open_store(SESSION_STORE_URL)
 
 # ---------- FastAPI ----------
 app = FastAPI(title="Argo AI Agent API")
@@ -57,146 +50,226 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     session_id: str
     answer: str
-    history: list
+    messages: list  # only the messages added by this turn
 
 # ---------- Helpers ----------
-def new_memory():
-    """Create a fresh summary memory buffer."""
-    return ConversationSummaryBufferMemory(
-        llm=chat_model,
-        max_token_limit=500,
-        return_messages=True
-    )
+def load_session(session_id: str):
+    """Load a session's summary and only the messages not yet folded into it."""
+    loaded = store.load_session(session_id)
+    if loaded is None:
+        return None
+    summary, summarized_upto, tail = loaded
+    return SessionMemory(session_id, summary=summary, tail=tail, summarized_upto=summarized_upto)
 
 
-def load_memory_from_db(session_id: str):
-    memory = new_memory()
-    with duckdb.connect(DB_PATH) as conn:
-        past_msgs = conn.execute(
-            "SELECT role, content FROM messages WHERE session_id=? ORDER BY created_at ASC",
-            [session_id]
-        ).fetchall()
+# Hot sessions stay in memory; every change is written through to the DB
+sessions = SessionCache(load_session)
+summarizer = Summarizer(get_chat_model, store.save_summary)
 
-        # ✅ Load summary from sessions table
-        result = conn.execute(
-            "SELECT summary FROM sessions WHERE id=?", [session_id]
-        ).fetchone()
-        summary = result[0] if result else None
+# ---------- Lifecycle ----------
+@app.on_event("startup")
+def migrate_store():
+    store.migrate()
 
-    if summary:
-        memory.moving_summary_buffer = summary  # ✅ Restore memory summary
 
-    for role, content in past_msgs:
-        if role == "user":
-            memory.chat_memory.add_user_message(content)
-        elif role == "assistant":
-            memory.chat_memory.add_ai_message(content)
+@app.on_event("startup")
+def start_background_workers():
+    summarizer.start()
+    print(f"[server] module imported in {IMPORT_MS} ms")
 
-    return memory
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    summarizer.stop()
 
 # ---------- Endpoints ----------
 
 @app.post("/sessions/new")
-async def create_session():
+def create_session():
     session_id = str(uuid.uuid4())
-    with duckdb.connect(DB_PATH) as conn:
-        conn.execute("INSERT INTO sessions (id) VALUES (?)", [session_id])
+    store.create_session(session_id)
     return {"session_id": session_id, "message": "New session created."}
 
 @app.get("/sessions")
-async def list_sessions():
-    with duckdb.connect(DB_PATH) as conn:
-        rows = conn.execute("SELECT id, created_at FROM sessions ORDER BY created_at DESC").fetchall()
-    return {"sessions": [{"id": r[0], "created_at": str(r[1])} for r in rows]}
+def list_sessions(
+        limit: int = Query(50, ge=1, le=200, description="Page size"),
+        before: Optional[str] = Query(None, description="Return sessions older than this session id"),
+):
+    rows = store.list_sessions(limit, before)
+    next_cursor = rows[-1][0] if len(rows) == limit else None
+    return {"sessions": [{"id": r[0], "created_at": str(r[1])} for r in rows], "next_cursor": next_cursor}
 
 @app.get("/sessions/{session_id}/history")
-async def get_history(session_id: str):
-    with duckdb.connect(DB_PATH) as conn:
-        rows = conn.execute(
-            "SELECT role, content, created_at FROM messages WHERE session_id=? ORDER BY created_at ASC",
-            [session_id]
-        ).fetchall()
-    if not rows:
+def get_history(
+        session_id: str,
+        limit: int = Query(100, ge=1, le=500, description="Page size"),
+        before: Optional[int] = Query(None, description="Return messages older than this message id"),
+        after: Optional[int] = Query(None, description="Return messages newer than this message id"),
+):
+    """One page of a session's messages in chronological order.
+
+    Without a cursor this is the newest page; follow `next_before` to page back in time.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    rows = store.history(session_id, limit, before, after)
+    if not rows and before is None and after is None:
         raise HTTPException(status_code=404, detail="Session not found or no messages")
-    history = [{"role": r[0], "content": r[1], "created_at": str(r[2])} for r in rows]
-    return {"session_id": session_id, "history": history}
+    history = [{"id": r[0], "role": r[1], "content": r[2], "created_at": str(r[3])} for r in rows]
+    next_before = rows[0][0] if rows and len(rows) == limit and after is None else None
+    return {"session_id": session_id, "history": history, "next_before": next_before}
 
 @app.delete("/sessions/{session_id}")
-async def delete_session(session_id: str):
-    with duckdb.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM messages WHERE session_id=?", [session_id])
-        conn.execute("DELETE FROM sessions WHERE id=?", [session_id])
+def delete_session(session_id: str):
+    store.delete_session(session_id)
+    sessions.drop(session_id)
     return {"message": f"Session {session_id} deleted."}
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    # 1️⃣ Check if session exists
-    with duckdb.connect(DB_PATH) as conn:
-        session_exists = conn.execute(
-            "SELECT COUNT(*) FROM sessions WHERE id=?", [req.session_id]
-        ).fetchone()[0]
-    if not session_exists:
+def start_turn(session_id: str):
+    """Return the session's memory (summary + unsummarized tail)."""
+    memory = sessions.get(session_id)
+    if memory is None:
         raise HTTPException(status_code=404, detail="Session not found")
+    return memory
 
-    # 2️⃣ Load session memory (messages + summary)
-    memory = load_memory_from_db(req.session_id)
 
-    # 3️⃣ Overwrite the global memory in app so the agent sees it
-    import app as app_module
-    app_module.summary_memory = memory
+def finish_turn(session_id: str, message: str, answer: str, memory):
+    """Persist the turn, update the session memory and queue summarization; return the new messages."""
+    # Save user message and AI response in one transaction
+    turn = [("user", message), ("assistant", answer)]
+    with span("persist", messages=len(turn)):
+        ids = store.append_messages(session_id, turn)
+    for message_id, (role, content) in zip(ids, turn):
+        memory.add_message(role, content, message_id)
 
-    # 4️⃣ Add current user message to memory
-    user_msg = HumanMessage(content=req.message)
-    memory.chat_memory.add_user_message(req.message)
+    # Summarization happens in the background, after the response is sent
+    summarizer.submit(memory)
+
+    return [{"id": i, "role": role, "content": content} for i, (role, content) in zip(ids, turn)]
 
-    # 5️⃣ Prepare conversation state for LangGraph
-    conversation_state = {"messages": [user_msg]}
-    final_answer = None
 
-    # 6️⃣ Stream the agent
-    for event in app_module.app.stream(conversation_state, {"recursion_limit": 15}):
+def run_agent(message: str, memory):
+    """Run the LangGraph agent to completion and return the final answer text."""
+    conversation_state = {"messages": [HumanMessage(content=message)], "memory": memory}
+    final_answer = None
+    for event in get_app().stream(conversation_state, {"recursion_limit": 15}):
         if "call_model" in event:
             last_message = event["call_model"]["messages"][-1]
             # Only final AI response, not tool calls
             if not getattr(last_message, "tool_calls", None):
                 final_answer = last_message
-                memory.chat_memory.add_ai_message(final_answer.content)
-
-    if not final_answer:
-        raise HTTPException(status_code=500, detail="Agent could not produce a response")
-
-    # 7️⃣ Save messages and updated summary to DB
-    with duckdb.connect(DB_PATH) as conn:
-        # Save user message
-        conn.execute(
-            "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
-            [req.session_id, "user", req.message]
-        )
-        # Save AI response
-        conn.execute(
-            "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
-            [req.session_id, "assistant", final_answer.content]
-        )
-        # Update session summary
-        conn.execute(
-            "UPDATE sessions SET summary=? WHERE id=?",
-            [memory.moving_summary_buffer, req.session_id]
-        )
-
-        # Reload full history for response
-        history = conn.execute(
-            "SELECT role, content FROM messages WHERE session_id=? ORDER BY created_at ASC",
-            [req.session_id]
-        ).fetchall()
+    return final_answer.content if final_answer else None
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    with start_trace("chat_turn", session_id=req.session_id) as turn:
+        # Agent and DuckDB calls are blocking; keep them off the event loop
+        # 1️⃣ Load session memory (summary + unsummarized tail)
+        with span("memory.load"):
+            memory = await run_in_threadpool(start_turn, req.session_id)
+
+        # 2️⃣ Formulaic questions are answered directly, without the LLM loop
+        with span("fast_path") as s:
+            answer = await run_in_threadpool(fast_path.try_answer, req.message)
+            s.set(matched=answer is not None)
+        if answer is None:
+            # 3️⃣ Run the agent
+            with span("agent"):
+                answer = await run_in_threadpool(run_agent, req.message, memory)
+
+        if not answer:
+            raise HTTPException(status_code=500, detail="Agent could not produce a response")
+
+        # 4️⃣ Save messages to DB; the summary is updated in the background
+        messages = await run_in_threadpool(finish_turn, req.session_id, req.message, answer, memory)
+        turn.set(answer_chars=len(answer))
 
     return ChatResponse(
         session_id=req.session_id,
-        answer=final_answer.content,
-        history=[{"role": r[0], "content": r[1]} for r in history]
+        answer=answer,
+        messages=messages
+    )
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Server-sent events version of /chat.
+
+    Emits `token` events as the final answer is generated, `tool_start` / `tool_end`
+    around every tool call, then a single `done` event with the full answer
+    (or `error` if the agent fails).
+    """
+    # Loaded before the stream opens so an unknown session is still a 404; outside
+    # the turn's trace the span only feeds the memory.load histogram
+    with span("memory.load"):
+        memory = await run_in_threadpool(start_turn, req.session_id)
+
+    async def events():
+        with start_trace("chat_turn", session_id=req.session_id, streaming=True):
+            async for event in turn_events():
+                yield event
+
+    async def turn_events():
+        with span("fast_path") as s:
+            answer = await run_in_threadpool(fast_path.try_answer, req.message)
+            s.set(matched=answer is not None)
+        if answer is not None:
+            yield sse("token", {"text": answer})
+        else:
+            conversation_state = {"messages": [HumanMessage(content=req.message)], "memory": memory}
+            try:
+                graph = await run_in_threadpool(get_app)
+                async for mode, payload in graph.astream(
+                    conversation_state, {"recursion_limit": 15}, stream_mode=["messages", "updates"]
+                ):
+                    if mode == "messages":
+                        chunk, metadata = payload
+                        if (
+                            metadata.get("langgraph_node") == "call_model"
+                            and isinstance(chunk, AIMessageChunk)
+                            and chunk.content
+                            and not chunk.tool_call_chunks
+                        ):
+                            yield sse("token", {"text": chunk.content})
+                    elif "call_model" in payload:
+                        last_message = payload["call_model"]["messages"][-1]
+                        for call in getattr(last_message, "tool_calls", None) or []:
+                            yield sse("tool_start", {"id": call["id"], "name": call["name"], "args": call["args"]})
+                        if not getattr(last_message, "tool_calls", None):
+                            answer = last_message.content
+                    elif "call_tool" in payload:
+                        for tool_msg in payload["call_tool"]["messages"]:
+                            yield sse("tool_end", {
+                                "id": tool_msg.tool_call_id,
+                                "name": tool_msg.name,
+                                "status": getattr(tool_msg, "status", "success"),
+                            })
+            except Exception as e:
+                yield sse("error", {"detail": f"Agent failed: {e}"})
+                return
+
+        if not answer:
+            yield sse("error", {"detail": "Agent could not produce a response"})
+            return
+        messages = await run_in_threadpool(finish_turn, req.session_id, req.message, answer, memory)
+        yield sse("done", {"session_id": req.session_id, "answer": answer, "messages": messages})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 @app.post("/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
+    # The Gemini SDK is only needed here; keep it out of worker startup
+    from google import genai
+
     client = genai.Client(api_key=GEMINI_API_KEY)
     # Save the uploaded file to a temporary location
     with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
@@ -213,4 +286,42 @@ async def transcribe_audio(file: UploadFile = File(...)):
         contents=[prompt, uploaded]
     )
 
-    return {"transcript": response.text}
\ No newline at end of file
+    return {"transcript": response.text}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit rate and saved execution time of the agent's SQL result cache."""
+    return get_query_cache().stats()
+
+
+@app.get("/metrics/latency")
+async def latency_metrics():
+    """Latency histograms per pipeline stage (span name) since startup."""
+    return histograms.snapshot()
+
+
+@app.get("/warmup")
+def warmup():
+    """Build the model client, agent graph and caches and check the database opens, rather than on the first chat.
+
+    Safe to call repeatedly (e.g. as a readiness probe); later calls return immediately.
+    """
+    timings, errors = {}, {}
+    for name, init in (
+        ("chat_model", get_chat_model),
+        ("graph", get_app),
+        ("database", lambda: open_db().close()),
+        ("query_cache", get_query_cache),
+        ("regions", regions.load_regions),
+    ):
+        started = time.perf_counter()
+        try:
+            init()
+        except Exception as e:
+            errors[name] = str(e)
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return {"ready": not errors, "import_ms": IMPORT_MS, "warmup_ms": timings, "errors": errors}
+
+
+IMPORT_MS = round((time.perf_counter() - _import_started) * 1000, 1)
@@ -0,0 +1,128 @@
+"""Per-session conversation memory and an in-process cache of hot sessions.
+
+Each chat session keeps a running summary plus the tail of messages that have not
+been folded into it yet. The memory object travels through the agent graph state,
+so concurrent sessions never share context, and hot sessions stay in an LRU so a
+turn does not have to re-read the conversation from the database.
+"""
+import threading
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+MAX_TOKEN_LIMIT = 500  # unsummarized tail budget, same as the old summary buffer
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used to size the tail."""
+    return len(text) // 4 + 1
+
+
+class SessionMemory:
+    """Summary + unsummarized tail of one session.
+
+    `tail` holds `(message_id, role, content)` tuples in order; `summarized_upto`
+    is the id of the last message already folded into `summary`.
+    """
+
+    def __init__(self, session_id: str, summary: str = "", tail=None, summarized_upto: int = 0,
+                 max_token_limit: int = MAX_TOKEN_LIMIT):
+        self.session_id = session_id
+        self.summary = summary or ""
+        self.tail = list(tail or [])
+        self.summarized_upto = summarized_upto or 0
+        self.max_token_limit = max_token_limit
+        self.lock = threading.Lock()
+
+    def add_message(self, role: str, content: str, message_id: int = 0):
+        with self.lock:
+            self.tail.append((message_id, role, content))
+
+    def as_messages(self) -> list:
+        """Summary (as a system message) followed by the raw tail, for the model prompt."""
+        with self.lock:
+            messages = [SystemMessage(content=self.summary)] if self.summary else []
+            for _, role, content in self.tail:
+                if role == "user":
+                    messages.append(HumanMessage(content=content))
+                elif role == "assistant":
+                    messages.append(AIMessage(content=content))
+            return messages
+
+    def tail_tokens(self) -> int:
+        with self.lock:
+            return sum(estimate_tokens(content) for _, _, content in self.tail)
+
+    def needs_summary(self) -> bool:
+        return self.tail_tokens() > self.max_token_limit
+
+    def prune(self, llm, target_tokens: int = None) -> bool:
+        """Fold the oldest tail messages into the summary once the tail exceeds its budget.
+
+        The tail is cut down to `target_tokens` (half the budget by default), so one
+        summary update covers several turns. Returns True if the summary changed.
+        The LLM is called outside the lock; until it returns, readers keep seeing
+        the old summary with the full tail.
+        """
+        if target_tokens is None:
+            target_tokens = self.max_token_limit // 2
+        with self.lock:
+            tokens = sum(estimate_tokens(content) for _, _, content in self.tail)
+            if tokens <= self.max_token_limit:
+                return False
+            overflow = []
+            for item in self.tail:
+                if tokens <= target_tokens:
+                    break
+                overflow.append(item)
+                tokens -= estimate_tokens(item[2])
+            summary = self.summary
+
+        # langchain itself is slow to import; only pay for it once a summary is due
+        from langchain.memory.prompt import SUMMARY_PROMPT
+
+        new_lines = "\n".join(
+            f"{'Human' if role == 'user' else 'AI'}: {content}" for _, role, content in overflow
+        )
+        response = llm.invoke(SUMMARY_PROMPT.format(summary=summary, new_lines=new_lines))
+
+        with self.lock:
+            # Only appends happen meanwhile, so the folded messages are still at the front
+            del self.tail[:len(overflow)]
+            self.summary = getattr(response, "content", str(response))
+            self.summarized_upto = max(self.summarized_upto, overflow[-1][0])
+        return True
+
+
+class SessionCache:
+    """LRU of hot `SessionMemory` objects, filled on miss by `loader(session_id)`.
+
+    `loader` returns a SessionMemory, or None if the session does not exist.
+    """
+
+    def __init__(self, loader, capacity: int = 256):
+        self.loader = loader
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    def get(self, session_id: str):
+        with self._lock:
+            memory = self._sessions.get(session_id)
+            if memory is not None:
+                self._sessions.move_to_end(session_id)
+                return memory
+        memory = self.loader(session_id)
+        if memory is None:
+            return None
+        with self._lock:
+            # Another request may have loaded it meanwhile; keep the first copy
+            memory = self._sessions.setdefault(session_id, memory)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+        return memory
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
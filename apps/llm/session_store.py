@@ -0,0 +1,282 @@
+"""Persistence for chat sessions and messages.
+
+Chat state is small, row-at-a-time and write-heavy, so it lives in its own store
+instead of the analytics `argo.db`, which every process can then open read-only.
+`open_store` picks the backend from a URL:
+
+    sqlite:///./LOCAL/Resources/sessions.sqlite   (default, WAL mode)
+    duckdb:///./LOCAL/Resources/argo.db           (legacy layout inside argo.db)
+"""
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import duckdb
+
+from tracing import span
+
+
+class SessionStore(ABC):
+    """Interface shared by the session store backends; a backend missing a method cannot be created."""
+
+    @abstractmethod
+    def migrate(self):
+        """Create tables and indexes if they do not exist."""
+
+    @abstractmethod
+    def create_session(self, session_id: str):
+        """Insert an empty session."""
+
+    @abstractmethod
+    def list_sessions(self, limit: int, before: str = None) -> list:
+        """Up to `limit` `(id, created_at)` rows, newest first, older than session `before`."""
+
+    @abstractmethod
+    def load_session(self, session_id: str):
+        """`(summary, summarized_upto, tail)` for a session, or None if it does not exist.
+
+        `tail` holds `(id, role, content)` rows after `summarized_upto`, in order.
+        """
+
+    @abstractmethod
+    def history(self, session_id: str, limit: int, before: int = None, after: int = None) -> list:
+        """Up to `limit` `(id, role, content, created_at)` rows of a session, in order.
+
+        With `after`, the page starts right after that message id; otherwise it is
+        the newest page, ending right before message `before` if given.
+        """
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: list) -> list:
+        """Insert `(role, content)` pairs in one transaction; return their ids."""
+
+    @abstractmethod
+    def save_summary(self, session_id: str, summary: str, summarized_upto: int):
+        """Store the rolling summary covering messages up to `summarized_upto`."""
+
+    @abstractmethod
+    def delete_session(self, session_id: str):
+        """Delete a session and its messages."""
+
+
+# ---------- Shared pagination queries ----------
+def _list_sessions_query(before):
+    cursor = ""
+    if before is not None:
+        # Keyset pagination on (created_at, id), anchored at the cursor session
+        cursor = """
+        WHERE created_at < (SELECT created_at FROM sessions WHERE id = ?)
+           OR (created_at = (SELECT created_at FROM sessions WHERE id = ?) AND id < ?)
+        """
+    return f"SELECT id, created_at FROM sessions {cursor} ORDER BY created_at DESC, id DESC LIMIT ?"
+
+
+def _list_sessions_params(limit, before):
+    return ([before, before, before] if before is not None else []) + [limit]
+
+
+def _history_query(session_id, limit, before, after):
+    if after is not None:
+        return (
+            "SELECT id, role, content, created_at FROM messages WHERE session_id=? AND id > ? ORDER BY id ASC LIMIT ?",
+            [session_id, after, limit],
+        )
+    if before is not None:
+        return (
+            "SELECT id, role, content, created_at FROM messages WHERE session_id=? AND id < ? ORDER BY id DESC LIMIT ?",
+            [session_id, before, limit],
+        )
+    return (
+        "SELECT id, role, content, created_at FROM messages WHERE session_id=? ORDER BY id DESC LIMIT ?",
+        [session_id, limit],
+    )
+
+
+def _in_order(rows, after):
+    # Pages read backwards from the newest message are flipped back to chronological order
+    return rows if after is not None else rows[::-1]
+
+
+class SQLiteSessionStore(SessionStore):
+    """Row-oriented store in a SQLite file in WAL mode, one connection per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def migrate(self):
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            summary TEXT,
+            summarized_upto INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+            role TEXT,
+            content TEXT,
+            created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages(session_id, created_at);
+        -- history pages are keyed on message id
+        CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages(session_id, id);
+        CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions(created_at);
+        """)
+
+    def create_session(self, session_id: str):
+        self.conn.execute("INSERT INTO sessions (id) VALUES (?)", [session_id])
+
+    def list_sessions(self, limit: int, before: str = None) -> list:
+        return self.conn.execute(_list_sessions_query(before), _list_sessions_params(limit, before)).fetchall()
+
+    def load_session(self, session_id: str):
+        row = self.conn.execute(
+            "SELECT summary, summarized_upto FROM sessions WHERE id=?", [session_id]
+        ).fetchone()
+        if row is None:
+            return None
+        tail = self.conn.execute(
+            "SELECT id, role, content FROM messages WHERE session_id=? AND id > ? ORDER BY id ASC",
+            [session_id, row[1] or 0]
+        ).fetchall()
+        return row[0], row[1] or 0, tail
+
+    def history(self, session_id: str, limit: int, before: int = None, after: int = None) -> list:
+        sql, params = _history_query(session_id, limit, before, after)
+        return _in_order(self.conn.execute(sql, params).fetchall(), after)
+
+    def append_messages(self, session_id: str, messages: list) -> list:
+        conn = self.conn
+        ids = []
+        # Time spent waiting for SQLite's single writer lock
+        with span("persist.lock_wait"):
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            for role, content in messages:
+                cur = conn.execute(
+                    "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                    [session_id, role, content]
+                )
+                ids.append(cur.lastrowid)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def save_summary(self, session_id: str, summary: str, summarized_upto: int):
+        self.conn.execute(
+            "UPDATE sessions SET summary=?, summarized_upto=? WHERE id=?",
+            [summary, summarized_upto, session_id]
+        )
+
+    def delete_session(self, session_id: str):
+        self.conn.execute("DELETE FROM sessions WHERE id=?", [session_id])
+
+
+class DuckDBSessionStore(SessionStore):
+    """The original layout: `sessions` and `messages` tables inside a DuckDB file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def migrate(self):
+        with duckdb.connect(self.path) as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id VARCHAR PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                summary TEXT
+            )
+            """)
+            # id of the last message already folded into the summary
+            conn.execute("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS summarized_upto INTEGER DEFAULT 0")
+            conn.execute("""
+            CREATE SEQUENCE IF NOT EXISTS message_id_seq;
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER DEFAULT nextval('message_id_seq'),
+                session_id VARCHAR,
+                role VARCHAR,
+                content TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+    def create_session(self, session_id: str):
+        with duckdb.connect(self.path) as conn:
+            conn.execute("INSERT INTO sessions (id) VALUES (?)", [session_id])
+
+    def list_sessions(self, limit: int, before: str = None) -> list:
+        with duckdb.connect(self.path) as conn:
+            return conn.execute(_list_sessions_query(before), _list_sessions_params(limit, before)).fetchall()
+
+    def load_session(self, session_id: str):
+        with duckdb.connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT summary, summarized_upto FROM sessions WHERE id=?", [session_id]
+            ).fetchone()
+            if row is None:
+                return None
+            tail = conn.execute(
+                "SELECT id, role, content FROM messages WHERE session_id=? AND id > ? ORDER BY id ASC",
+                [session_id, row[1] or 0]
+            ).fetchall()
+        return row[0], row[1] or 0, tail
+
+    def history(self, session_id: str, limit: int, before: int = None, after: int = None) -> list:
+        sql, params = _history_query(session_id, limit, before, after)
+        with duckdb.connect(self.path) as conn:
+            return _in_order(conn.execute(sql, params).fetchall(), after)
+
+    def append_messages(self, session_id: str, messages: list) -> list:
+        ids = []
+        with duckdb.connect(self.path) as conn:
+            conn.begin()
+            for role, content in messages:
+                ids.append(conn.execute(
+                    "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?) RETURNING id",
+                    [session_id, role, content]
+                ).fetchone()[0])
+            conn.commit()
+        return ids
+
+    def save_summary(self, session_id: str, summary: str, summarized_upto: int):
+        with duckdb.connect(self.path) as conn:
+            conn.execute(
+                "UPDATE sessions SET summary=?, summarized_upto=? WHERE id=?",
+                [summary, summarized_upto, session_id]
+            )
+
+    def delete_session(self, session_id: str):
+        with duckdb.connect(self.path) as conn:
+            conn.execute("DELETE FROM messages WHERE session_id=?", [session_id])
+            conn.execute("DELETE FROM sessions WHERE id=?", [session_id])
+
+
+BACKENDS = {
+    "sqlite": SQLiteSessionStore,
+    "duckdb": DuckDBSessionStore,
+}
+
+
+def open_store(url: str) -> SessionStore:
+    """Build a store from `<backend>:///<path>`."""
+    scheme, sep, path = url.partition(":///")
+    if not sep or scheme not in BACKENDS:
+        raise ValueError(f"Unsupported session store URL {url!r}; expected one of {sorted(BACKENDS)} as <backend>:///<path>")
+    return BACKENDS[scheme](path)
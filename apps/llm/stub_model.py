@@ -0,0 +1,154 @@
+"""Deterministic, offline stand-in for the chat model (LLM_BACKEND=stub).
+
+`ScriptedChatModel` replays scripted tool calls and answers instead of calling
+Groq, so the agent graph, memory and storage layers can be exercised and
+benchmarked without network access. A script is a list of entries; the first
+entry whose `match` occurs in the user's question is replayed:
+
+    [{"match": "compare",
+      "tool_calls": [{"name": "database_batch_query_tool", "args": {...}}],
+      "answer": "..."}]
+
+Each tool call is made in its own model step, then the answer is returned with
+`{result}` replaced by the last tool result. STUB_LLM_SCRIPT points at a JSON file
+with a custom script; STUB_LLM_LATENCY_MS adds a fixed delay to every model call
+to stand in for model think time.
+"""
+import json
+import os
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field
+
+from session_memory import estimate_tokens
+
+DEFAULT_SCRIPT = [
+    {
+        "match": "compare",
+        "tool_calls": [{
+            "name": "database_batch_query_tool",
+            "args": {
+                "queries": ["SELECT AVG(temp_c) AS avg_temp FROM argo{year} WHERE temp_c IS NOT NULL "
+                            "AND NOT ISNAN(temp_c) AND temp_qc < 3"],
+                "years": [2022, 2023, 2024],
+            },
+        }],
+        "answer": "Yearly average temperatures: {result}",
+    },
+    {
+        "match": "how many",
+        "tool_calls": [{"name": "database_query_tool", "args": {"query": "SELECT COUNT(*) AS n FROM argo2023"}}],
+        "answer": "The 2023 table holds {result} measurements.",
+    },
+    {
+        "match": "salinity",
+        "tool_calls": [{
+            "name": "database_query_tool",
+            "args": {"query": "SELECT AVG(sal_psu) AS avg_sal FROM argo2023 WHERE sal_psu IS NOT NULL "
+                              "AND NOT ISNAN(sal_psu) AND psal_qc < 3 AND region_name ILIKE 'Bay of Bengal'",
+                     "approximate": True},
+        }],
+        "answer": "The average salinity in the Bay of Bengal was about {result}.",
+    },
+    {
+        "match": "",
+        "tool_calls": [{
+            "name": "database_query_tool",
+            "args": {"query": "SELECT AVG(temp_c) AS avg_temp FROM argo2023 WHERE temp_c IS NOT NULL "
+                              "AND NOT ISNAN(temp_c) AND temp_qc < 3 AND region_name ILIKE 'Arabian Sea'"},
+        }],
+        "answer": "The average temperature in the Arabian Sea was {result}.",
+    },
+]
+
+
+def load_script():
+    path = os.getenv("STUB_LLM_SCRIPT")
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replays `script` instead of generating.
+
+    Without bound tools (conversation summaries, general knowledge questions) it
+    returns a short deterministic digest of the prompt.
+    """
+
+    script: list = Field(default_factory=load_script)
+    latency_ms: float = Field(default_factory=lambda: float(os.getenv("STUB_LLM_LATENCY_MS", "0")))
+    tools_bound: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-stub"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools_bound": True})
+
+    def _next_message(self, messages) -> AIMessage:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+
+        if not self.tools_bound:
+            text = str(messages[-1].content)
+            content = f"Summary: {' '.join(text.split())[-300:]}"
+            return self._with_usage(AIMessage(content=content), prompt_tokens)
+
+        # Replay position = tool steps already taken since the current question
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        turn = messages[last_human + 1:]
+        step = sum(1 for m in turn if isinstance(m, AIMessage) and m.tool_calls)
+        question = str(messages[last_human].content).lower() if last_human >= 0 else ""
+        entry = next((e for e in self.script if e.get("match", "") in question), None)
+        if entry is None:
+            return self._with_usage(AIMessage(content="I have no scripted answer for that."), prompt_tokens)
+
+        calls = entry.get("tool_calls", [])
+        if step < len(calls):
+            call = calls[step]
+            message = AIMessage(content="", tool_calls=[{"id": f"stub-{step}", "name": call["name"], "args": call["args"]}])
+            return self._with_usage(message, prompt_tokens)
+
+        results = [m for m in turn if isinstance(m, ToolMessage)]
+        result = " ".join(str(results[-1].content).split())[:200] if results else ""
+        return self._with_usage(AIMessage(content=entry.get("answer", "{result}").replace("{result}", result)), prompt_tokens)
+
+    @staticmethod
+    def _with_usage(message, prompt_tokens):
+        output_tokens = estimate_tokens(str(message.content)) + 10 * len(message.tool_calls)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": prompt_tokens + output_tokens,
+        }
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._next_message(messages)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"id": c["id"], "name": c["name"], "args": json.dumps(c["args"]), "index": i}
+                    for i, c in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            ))
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=text,
+                usage_metadata=message.usage_metadata if i == 0 else None,
+            ))
@@ -0,0 +1,85 @@
+"""Background conversation summarization.
+
+Folding old messages into a session's summary costs an extra LLM round trip. The
+`Summarizer` runs it on a worker thread after the response has been sent: turns
+enqueue their session, the worker drains the queue in batches (one update per
+session however many turns queued up), writes the new summary through `persist`
+and swaps it into the cached SessionMemory. The next turn simply uses whatever
+summary is available plus the raw tail.
+"""
+import queue
+import threading
+import time
+
+from tracing import span, start_trace
+
+
+class Summarizer:
+    def __init__(self, get_llm, persist, batch_window: float = 0.5):
+        """`get_llm()` returns the model to summarize with (looked up lazily, on the worker);
+        `persist(session_id, summary, summarized_upto)` stores an updated summary."""
+        self.get_llm = get_llm
+        self.persist = persist
+        self.batch_window = batch_window
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="summarizer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, memory):
+        """Queue a session for summarization if its tail is over budget."""
+        if not memory.needs_summary():
+            return
+        with self._pending_lock:
+            if memory.session_id in self._pending:
+                return
+            self._pending.add(memory.session_id)
+        self._queue.put(memory)
+
+    def _drain(self, first):
+        """Collect everything queued within the batch window, one entry per session."""
+        batch = {first.session_id: first}
+        deadline = time.monotonic() + self.batch_window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                memory = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if memory is None:
+                break
+            batch[memory.session_id] = memory
+        return batch.values()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            first = self._queue.get()
+            if first is None:
+                continue
+            for memory in self._drain(first):
+                with self._pending_lock:
+                    self._pending.discard(memory.session_id)
+                try:
+                    with start_trace("summarize", session_id=memory.session_id) as s:
+                        summarized = memory.prune(self.get_llm())
+                        if summarized:
+                            with span("persist.summary"):
+                                self.persist(memory.session_id, memory.summary, memory.summarized_upto)
+                        s.set(summarized=summarized)
+                except Exception as e:
+                    print(f"[summarizer] session {memory.session_id}: {e}")
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from ingest import EARTH_RADIUS_KM, path_significance
+
+
+def unit(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def angle(u, v):
+    """Angles between the rows of u and v (either may be a single vector)."""
+    return np.arctan2(np.linalg.norm(np.cross(u, v), axis=-1), np.sum(u * v, axis=-1))
+
+
+def distance_to_arc_km(p, a, b):
+    """Great-circle distances from the rows of p to the shorter arc a-b, via the closest point on its circle."""
+    normal = np.cross(a, b)
+    if np.linalg.norm(normal) < 1e-12:
+        return EARTH_RADIUS_KM * angle(p, a)
+    normal /= np.linalg.norm(normal)
+    foot = p - np.outer(p @ normal, normal)
+    foot /= np.maximum(np.linalg.norm(foot, axis=1), 1e-300)[:, None]
+    on_arc = np.abs(angle(a, foot) + angle(foot, b) - angle(a, b)) < 1e-9
+    return EARTH_RADIUS_KM * np.where(on_arc, angle(p, foot), np.minimum(angle(p, a), angle(p, b)))
+
+
+def douglas_peucker(points, tolerance, splits):
+    """Indices kept by recursive Douglas–Peucker at `tolerance` km.
+
+    `splits` memoizes the farthest point of each span, which does not depend on the tolerance.
+    """
+    def simplify(first, last, kept):
+        if last - first < 2:
+            return
+        if (first, last) not in splits:
+            distances = distance_to_arc_km(points[first + 1:last], points[first], points[last])
+            split = first + 1 + int(np.argmax(distances))
+            splits[first, last] = split, distances[split - first - 1]
+        split, distance = splits[first, last]
+        if distance > tolerance:
+            kept.add(split)
+            simplify(first, split, kept)
+            simplify(split, last, kept)
+
+    kept = {0, len(points) - 1}
+    simplify(0, len(points) - 1, kept)
+    return kept
+
+
+def random_tracks(count=200, seed=11):
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        n = int(rng.integers(3, 60))
+        start_lat = rng.uniform(-80, 80)
+        if i % 10 == 0:
+            start_lat = rng.choice([-1, 1]) * rng.uniform(85, 89)  # near a pole
+        start_lon = 179.0 if i % 10 == 1 else rng.uniform(-180, 180)  # across ±180°
+        lat = np.clip(start_lat + np.cumsum(rng.normal(0, 0.5, n)), -89.9, 89.9)
+        lon = (start_lon + np.cumsum(rng.normal(0, 0.8, n)) + 180) % 360 - 180
+        if i % 10 == 2:
+            lat[-1], lon[-1] = lat[0], lon[0]  # closed loop: the chord is a single point
+        yield lat, lon
+
+
+TRACKS = list(random_tracks())
+
+
+@pytest.mark.parametrize("track", range(len(TRACKS)))
+def test_thresholding_matches_recursive_douglas_peucker(track):
+    lat, lon = TRACKS[track]
+    significance = path_significance(lat, lon)
+    points = unit(lat, lon)
+    # Capped significances repeat; tolerances go between (never on) distinct values
+    finite = np.unique(significance[np.isfinite(significance)])
+    between = (finite[1:] + finite[:-1]) / 2
+    splits = {}
+    for tolerance in [0.0, 1e9, *between]:
+        assert set(np.flatnonzero(significance > tolerance).tolist()) == douglas_peucker(points, tolerance, splits)
+
+
+def test_end_points_are_always_kept():
+    significance = path_significance([0, 1, 2, 3], [0, 5, 0, 5])
+    assert np.isinf(significance[[0, -1]]).all()
+    assert np.isfinite(significance[1:-1]).all()
+
+
+def test_short_tracks():
+    assert np.isinf(path_significance([10], [20])).all()
+    assert np.isinf(path_significance([10, 11], [20, 21])).all()
+
+
+def test_points_on_the_chord_are_insignificant():
+    significance = path_significance([0, 0, 0, 0], [0, 1, 2, 3])
+    np.testing.assert_allclose(significance[1:-1], 0, atol=1e-6)
+
+
+def test_distance_of_an_off_chord_point():
+    # One degree of latitude off an equatorial chord is one degree of arc
+    significance = path_significance([0, 1, 0], [0, 5, 10])
+    assert significance[1] == pytest.approx(EARTH_RADIUS_KM * np.radians(1), rel=1e-9)
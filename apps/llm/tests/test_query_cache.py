@@ -0,0 +1,92 @@
+import pytest
+
+from query_cache import QueryCache, normalize_sql
+
+
+@pytest.mark.parametrize("a, b", [
+    # whitespace, keyword case and a trailing semicolon
+    ("SELECT AVG(temp_c) FROM argo2023 WHERE lat > 10",
+     "select   avg(temp_c)\n  from argo2023\n where lat > 10;"),
+    # table name case
+    ("SELECT COUNT(*) FROM argo2023", "SELECT COUNT(*) FROM ARGO2023"),
+    # order of AND / OR terms
+    ("SELECT * FROM argo2023 WHERE lat > 10 AND lon < 5 AND temp_qc < 3",
+     "SELECT * FROM argo2023 WHERE temp_qc < 3 AND lon < 5 AND lat > 10"),
+    ("SELECT * FROM argo2023 WHERE lat > 10 OR lon < 5", "SELECT * FROM argo2023 WHERE lon < 5 OR lat > 10"),
+    # order of IN lists
+    ("SELECT * FROM argo2023 WHERE platform_id IN (3, 1, 2)", "SELECT * FROM argo2023 WHERE platform_id IN (1, 2, 3)"),
+    # ILIKE literals are compared case-insensitively
+    ("SELECT * FROM argo2023 WHERE region_name ILIKE 'Arabian Sea'",
+     "SELECT * FROM argo2023 WHERE region_name ILIKE 'arabian sea'"),
+])
+def test_equivalent_queries_share_a_key(a, b):
+    assert normalize_sql(a) == normalize_sql(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    # aliases and column names name the result columns
+    ('SELECT AVG(temp_c) AS "Avg" FROM argo2023', 'SELECT AVG(temp_c) AS "avg" FROM argo2023'),
+    ("SELECT Temp_C FROM argo2023", "SELECT temp_c FROM argo2023"),
+    # LIKE and = are case-sensitive
+    ("SELECT * FROM argo2023 WHERE region_name LIKE 'Arabian Sea'",
+     "SELECT * FROM argo2023 WHERE region_name LIKE 'arabian sea'"),
+    ("SELECT * FROM argo2023 WHERE region_name = 'Arabian Sea'",
+     "SELECT * FROM argo2023 WHERE region_name = 'arabian sea'"),
+    # different constants, tables and operand order of non-commutative operators
+    ("SELECT * FROM argo2023 WHERE lat > 10", "SELECT * FROM argo2023 WHERE lat > 11"),
+    ("SELECT COUNT(*) FROM argo2023", "SELECT COUNT(*) FROM argo2024"),
+    ("SELECT lat - lon FROM argo2023", "SELECT lon - lat FROM argo2023"),
+    # only the IN list is reordered, not the tested value
+    ("SELECT * FROM argo2023 WHERE 1 IN (platform_id, 2)", "SELECT * FROM argo2023 WHERE platform_id IN (1, 2)"),
+])
+def test_different_queries_get_different_keys(a, b):
+    assert normalize_sql(a) != normalize_sql(b)
+
+
+def test_unparseable_sql_falls_back_to_whitespace_normalization():
+    assert normalize_sql("SELEC  1 FROM;") == normalize_sql("SELEC 1\nFROM")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("THALASSA_DATASET_VERSION", "v1")
+    return QueryCache(str(tmp_path / "argo.db"), str(tmp_path / "cache.sqlite"))
+
+
+def test_variants_are_cached_separately(cache):
+    cache.put("SELECT 1", {"data": [["exact"]]}, 0.5)
+    cache.put("SELECT 1", {"data": [["approx"]]}, 0.5, "approx")
+    assert cache.get("select 1") == {"data": [["exact"]]}
+    assert cache.get("select 1", "approx") == {"data": [["approx"]]}
+
+
+def test_entries_survive_a_restart(cache, tmp_path):
+    cache.put("SELECT 1", {"data": [["1"]]}, 0.5)
+    reopened = QueryCache(str(tmp_path / "argo.db"), str(tmp_path / "cache.sqlite"))
+    assert reopened.get("SELECT 1") == {"data": [["1"]]}
+
+
+def test_a_new_dataset_version_drops_entries(cache, tmp_path, monkeypatch):
+    cache.put("SELECT 1", {"data": [["1"]]}, 0.5)
+    monkeypatch.setenv("THALASSA_DATASET_VERSION", "v2")
+    assert cache.get("SELECT 1") is None
+    reopened = QueryCache(str(tmp_path / "argo.db"), str(tmp_path / "cache.sqlite"))
+    assert reopened.get("SELECT 1") is None
+
+
+def test_results_from_an_older_version_are_not_stored(cache):
+    cache.put("SELECT 1", {"data": [["1"]]}, 0.5, version="v0")
+    assert cache.get("SELECT 1") is None
+    cache.put("SELECT 1", {"data": [["1"]]}, 0.5, version="v1")
+    assert cache.get("SELECT 1") == {"data": [["1"]]}
+
+
+def test_lru_is_bounded_by_payload_size(tmp_path, monkeypatch):
+    monkeypatch.setenv("THALASSA_DATASET_VERSION", "v1")
+    cache = QueryCache(str(tmp_path / "argo.db"), str(tmp_path / "cache.sqlite"), max_bytes=100)
+    for i in range(5):
+        cache.put(f"SELECT {i}", {"data": [[str(i) * 20]]}, 0.1)
+    stats = cache.stats()
+    assert stats["bytes"] <= 100
+    assert cache.get("SELECT 4") is not None
+    assert cache.get("SELECT 0") is None
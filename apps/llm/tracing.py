@@ -0,0 +1,242 @@
+"""Per-turn tracing and latency histograms for the chat pipeline.
+
+A chat turn opens a trace with `start_trace`; code along the way wraps its work in
+`span(...)` (memory load, model calls, tool calls, SQL, persistence). Spans nest
+through a context variable, so they also follow work handed to threads with a
+copied context. When the root closes, the finished spans are exported as one JSON
+line per span to TRACE_FILE and, if the OpenTelemetry SDK is installed and
+OTEL_EXPORTER_OTLP_ENDPOINT is set, to an OTLP collector. Every span also feeds an
+in-process latency histogram per span name.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+TRACE_FILE = os.getenv("TRACE_FILE", "./LOCAL/traces.jsonl")
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "end", "error")
+
+    def __init__(self, trace_id, parent_id, name, attrs):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time_ns()) - self.start) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attrs,
+            "error": self.error,
+        }
+
+
+class _NullSpan:
+    """Returned by `span` outside a trace so callers can always call `.set`."""
+
+    def set(self, **attrs):
+        pass
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+
+# ---------- Histograms ----------
+class LatencyHistograms:
+    """Cumulative per-span-name latency histograms with fixed millisecond buckets."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def observe(self, name: str, ms: float):
+        with self._lock:
+            h = self._data.setdefault(name, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0, "counts": [0] * (len(self.buckets) + 1)})
+            h["count"] += 1
+            h["sum_ms"] += ms
+            h["max_ms"] = max(h["max_ms"], ms)
+            for i, bound in enumerate(self.buckets):
+                if ms <= bound:
+                    h["counts"][i] += 1
+                    break
+            else:
+                h["counts"][-1] += 1
+
+    def _quantile(self, h, q):
+        target = q * h["count"]
+        seen = 0
+        for i, n in enumerate(h["counts"]):
+            seen += n
+            if seen >= target and n:
+                return self.buckets[i] if i < len(self.buckets) else h["max_ms"]
+        return h["max_ms"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {}
+            for name, h in sorted(self._data.items()):
+                out[name] = {
+                    "count": h["count"],
+                    "mean_ms": round(h["sum_ms"] / h["count"], 3),
+                    "p50_ms": self._quantile(h, 0.5),
+                    "p95_ms": self._quantile(h, 0.95),
+                    "max_ms": round(h["max_ms"], 3),
+                    "buckets_ms": {str(b): c for b, c in zip(list(self.buckets) + ["inf"], h["counts"])},
+                }
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+histograms = LatencyHistograms()
+
+
+# ---------- Exporters ----------
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"[tracing] could not write {self.path}: {e}")
+
+
+class OtlpExporter:
+    """Replays finished spans into the OpenTelemetry SDK (optional dependency)."""
+
+    def __init__(self):
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": "thalassa-llm"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._trace = trace
+        self._tracer = provider.get_tracer("thalassa.llm")
+
+    def export(self, spans):
+        by_id = {}
+        for s in sorted(spans, key=lambda s: s.start):
+            parent = by_id.get(s.parent_id)
+            ctx = self._trace.set_span_in_context(parent) if parent is not None else None
+            otel_span = self._tracer.start_span(s.name, context=ctx, start_time=s.start,
+                                                attributes={k: v for k, v in s.attrs.items() if v is not None})
+            if s.error:
+                otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, s.error))
+            by_id[s.span_id] = otel_span
+        for s in spans:
+            by_id[s.span_id].end(end_time=s.end)
+
+
+exporters = [JsonlExporter(TRACE_FILE)] if TRACE_FILE else []
+if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    try:
+        exporters.append(OtlpExporter())
+    except ImportError:
+        print("[tracing] OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk / exporter are not installed")
+
+
+# ---------- API ----------
+def _reset(var, token):
+    try:
+        var.reset(token)
+    except ValueError:
+        # Closed from another context (e.g. a streaming response torn down by a disconnect)
+        pass
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span. Outside a trace only the histogram is fed."""
+    trace = _current_trace.get()
+    if trace is None:
+        started = time.perf_counter()
+        try:
+            yield _NullSpan()
+        finally:
+            histograms.observe(name, (time.perf_counter() - started) * 1000)
+        return
+
+    parent = _current_span.get()
+    s = Span(trace.trace_id, parent.span_id if parent else None, name, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end = time.time_ns()
+        _reset(_current_span, token)
+        trace.add(s)
+        histograms.observe(name, s.duration_ms)
+
+
+@contextlib.contextmanager
+def start_trace(name: str, **attrs):
+    """Open a new trace rooted at `name`; its spans are exported when the block exits."""
+    trace = Trace()
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        _reset(_current_span, span_token)
+        _reset(_current_trace, trace_token)
+        for exporter in exporters:
+            try:
+                exporter.export(trace.spans)
+            except Exception as e:
+                print(f"[tracing] export failed: {e}")
+
+
+def wrap_context(fn):
+    """Bind `fn` to a copy of the current context, for work submitted to thread pools."""
+    ctx = contextvars.copy_context()
+    # A context can only be entered by one thread at a time; give each call its own copy
+    return lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs)
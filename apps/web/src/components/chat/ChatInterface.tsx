@@ -21,6 +21,13 @@ export default function ChatInterface() {
   const [sidebarOpen, setSidebarOpen] = useState(false)
   const [connectionError, setConnectionError] = useState<string | null>(null)
   const [isConnected, setIsConnected] = useState(false)
+  // Cursors for the next (older) page; null once everything is loaded
+  const [sessionsCursor, setSessionsCursor] = useState<string | null>(null)
+  const [historyCursor, setHistoryCursor] = useState<number | null>(null)
+  const [isLoadingMoreSessions, setIsLoadingMoreSessions] = useState(false)
+  const [isLoadingEarlier, setIsLoadingEarlier] = useState(false)
+  // Session whose history is on screen; late responses for other sessions are dropped
+  const activeSessionIdRef = useRef<string | null>(null)
 
   const containerRef = useFadeIn<HTMLDivElement>(0, 'none')
   const headerRef = useFadeIn<HTMLDivElement>(0.2, 'down')
@@ -70,6 +77,8 @@ export default function ChatInterface() {
 
   // Load messages when session changes
   useEffect(() => {
+    activeSessionIdRef.current = currentSession?.id ?? null
+    setHistoryCursor(null)
     if (currentSession) {
       loadMessages(currentSession.id)
     }
@@ -80,6 +89,7 @@ export default function ChatInterface() {
       setConnectionError(null)
       const sessionData = await chatService.getSessions()
       setSessions(sessionData.sessions)
+      setSessionsCursor(sessionData.next_cursor)
       setIsConnected(true)
     } catch (error) {
       console.error('Failed to load sessions:', error)
@@ -90,11 +100,32 @@ export default function ChatInterface() {
     }
   }
 
+  const loadMoreSessions = async () => {
+    if (!sessionsCursor || isLoadingMoreSessions) return
+    try {
+      setIsLoadingMoreSessions(true)
+      const sessionData = await chatService.getSessions({
+        before: sessionsCursor,
+      })
+      setSessions((prev) => {
+        const known = new Set(prev.map((s) => s.id))
+        return [...prev, ...sessionData.sessions.filter((s) => !known.has(s.id))]
+      })
+      setSessionsCursor(sessionData.next_cursor)
+    } catch (error) {
+      console.error('Failed to load more sessions:', error)
+    } finally {
+      setIsLoadingMoreSessions(false)
+    }
+  }
+
   const loadMessages = async (sessionId: string) => {
     try {
       setIsLoading(true)
       const history = await chatService.getHistory(sessionId)
+      if (activeSessionIdRef.current !== sessionId) return
       setMessages(history.history)
+      setHistoryCursor(history.next_before)
     } catch (error) {
       // Handle 404 errors gracefully for new sessions with no history
       if (error instanceof Error && error.message.includes('404')) {
@@ -111,6 +142,24 @@ export default function ChatInterface() {
     }
   }
 
+  const loadEarlierMessages = async () => {
+    const sessionId = currentSession?.id
+    if (!sessionId || historyCursor === null || isLoadingEarlier) return
+    try {
+      setIsLoadingEarlier(true)
+      const history = await chatService.getHistory(sessionId, {
+        before: historyCursor,
+      })
+      if (activeSessionIdRef.current !== sessionId) return
+      setMessages((prev) => [...history.history, ...prev])
+      setHistoryCursor(history.next_before)
+    } catch (error) {
+      console.error('Failed to load earlier messages:', error)
+    } finally {
+      setIsLoadingEarlier(false)
+    }
+  }
+
   const createNewSession = async () => {
     try {
       // Haptic feedback for creating new session
@@ -188,8 +237,8 @@ export default function ChatInterface() {
       // Send to API
       const response = await chatService.sendMessage(currentSession.id, message)
 
-      // Update messages with the full history from response
-      setMessages(response.history)
+      // Replace the optimistic user message with the persisted turn
+      setMessages((prev) => [...prev.slice(0, -1), ...response.messages])
 
       // Haptic feedback for receiving response
       hapticUtils.receiveMessage()
@@ -223,6 +272,9 @@ export default function ChatInterface() {
         onDeleteSession={deleteSession}
         isOpen={sidebarOpen}
         onToggle={() => setSidebarOpen(!sidebarOpen)}
+        hasMore={sessionsCursor !== null}
+        isLoadingMore={isLoadingMoreSessions}
+        onLoadMore={loadMoreSessions}
       />
 
       {/* Main Chat Area */}
@@ -360,7 +412,13 @@ export default function ChatInterface() {
         {/* Messages Area */}
         <div className='flex min-h-0 flex-1 flex-col overflow-hidden'>
           {currentSession && (
-            <ChatMessages messages={messages} isLoading={isLoading} />
+            <ChatMessages
+              messages={messages}
+              isLoading={isLoading}
+              hasEarlier={historyCursor !== null}
+              isLoadingEarlier={isLoadingEarlier}
+              onLoadEarlier={loadEarlierMessages}
+            />
           )}
         </div>
 
@@ -8,11 +8,18 @@ import { useStaggerChildren, useFadeIn } from '@/hooks/useAnimations'
 interface ChatMessagesProps {
   messages: Message[]
   isLoading: boolean
+  // Older messages are fetched a page at a time
+  hasEarlier?: boolean
+  isLoadingEarlier?: boolean
+  onLoadEarlier?: () => void
 }
 
 export default function ChatMessages({
   messages,
   isLoading,
+  hasEarlier = false,
+  isLoadingEarlier = false,
+  onLoadEarlier,
 }: ChatMessagesProps) {
   const messagesEndRef = useRef<HTMLDivElement>(null)
   const messagesContainerRef = useStaggerChildren<HTMLDivElement>(0, 0.1)
@@ -22,9 +29,11 @@ export default function ChatMessages({
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }
 
+  // Follow new messages, but stay put when earlier ones are prepended
+  const lastMessage = messages[messages.length - 1]
   useEffect(() => {
     scrollToBottom()
-  }, [messages, isLoading])
+  }, [lastMessage, isLoading])
 
   const formatTime = (dateString?: string) => {
     if (!dateString) return ''
@@ -65,9 +74,20 @@ export default function ChatMessages({
         </div>
       ) : (
         <>
+          {hasEarlier && (
+            <div className='flex justify-center'>
+              <button
+                onClick={onLoadEarlier}
+                disabled={isLoadingEarlier}
+                className='rounded-md px-3 py-1 text-sm text-blue-600 hover:bg-cyan-50 hover:text-cyan-700 disabled:opacity-50 dark:text-blue-400 dark:hover:bg-slate-700/50 dark:hover:text-cyan-300'
+              >
+                {isLoadingEarlier ? 'Loading...' : 'Load earlier messages'}
+              </button>
+            </div>
+          )}
           {messages.map((message, index) => (
             <div
-              key={index}
+              key={message.id ?? `pending-${index}`}
               className={`flex ${message.role === 'user' ? 'justify-end' : 'justify-start'}`}
             >
               <div
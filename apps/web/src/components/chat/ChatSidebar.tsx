@@ -11,6 +11,10 @@ interface ChatSidebarProps {
   onDeleteSession: (sessionId: string) => void
   isOpen: boolean
   onToggle: () => void
+  // Older sessions are fetched a page at a time
+  hasMore?: boolean
+  isLoadingMore?: boolean
+  onLoadMore?: () => void
 }
 
 export default function ChatSidebar({
@@ -21,6 +25,9 @@ export default function ChatSidebar({
   onDeleteSession,
   isOpen,
   onToggle,
+  hasMore = false,
+  isLoadingMore = false,
+  onLoadMore,
 }: ChatSidebarProps) {
   const [deletingSession, setDeletingSession] = useState<string | null>(null)
 
@@ -241,6 +248,15 @@ export default function ChatSidebar({
                     </div>
                   </div>
                 ))}
+                {hasMore && (
+                  <button
+                    onClick={onLoadMore}
+                    disabled={isLoadingMore}
+                    className='w-full rounded-lg p-2 text-center text-sm text-blue-600 hover:bg-cyan-50 hover:text-cyan-700 disabled:opacity-50 dark:text-blue-400 dark:hover:bg-slate-700/50 dark:hover:text-cyan-300'
+                  >
+                    {isLoadingMore ? 'Loading...' : 'Load older sessions'}
+                  </button>
+                )}
               </div>
             )}
           </div>
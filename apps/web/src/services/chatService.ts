@@ -37,12 +37,38 @@ class ChatService {
         })
     }
 
-    async getSessions(): Promise<SessionsResponse> {
-        return this.fetchApi<SessionsResponse>('/sessions')
+    // Both lists are paged: pass the previous page's `next_cursor` /
+    // `next_before` as `before` to get the next (older) page.
+    async getSessions(
+        options: { limit?: number; before?: string | null } = {}
+    ): Promise<SessionsResponse> {
+        return this.fetchApi<SessionsResponse>(
+            `/sessions${this.pageQuery(options)}`
+        )
     }
 
-    async getHistory(sessionId: string): Promise<HistoryResponse> {
-        return this.fetchApi<HistoryResponse>(`/sessions/${sessionId}/history`)
+    async getHistory(
+        sessionId: string,
+        options: { limit?: number; before?: number | null } = {}
+    ): Promise<HistoryResponse> {
+        return this.fetchApi<HistoryResponse>(
+            `/sessions/${sessionId}/history${this.pageQuery(options)}`
+        )
+    }
+
+    private pageQuery(options: {
+        limit?: number
+        before?: string | number | null
+    }): string {
+        const params = new URLSearchParams()
+        if (options.limit !== undefined) {
+            params.set('limit', String(options.limit))
+        }
+        if (options.before !== undefined && options.before !== null) {
+            params.set('before', String(options.before))
+        }
+        const query = params.toString()
+        return query ? `?${query}` : ''
     }
 
     async deleteSession(sessionId: string): Promise<{ message: string }> {
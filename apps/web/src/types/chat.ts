@@ -4,6 +4,7 @@ export interface Session {
 }
 
 export interface Message {
+    id?: number
     role: 'user' | 'assistant'
     content: string
     created_at?: string
@@ -17,16 +18,19 @@ export interface ChatRequest {
 export interface ChatResponse {
     session_id: string
     answer: string
-    history: Message[]
+    // only the messages added by this turn
+    messages: Message[]
 }
 
 export interface SessionsResponse {
     sessions: Session[]
+    next_cursor: string | null
 }
 
 export interface HistoryResponse {
     session_id: string
     history: Message[]
+    next_before: number | null
 }
 
 export interface NewSessionResponse {